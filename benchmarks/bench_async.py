@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the throughput of AsyncPublic.ticker() run concurrently against the
+blocking Public.ticker(), on a local server answering with some latency.
+Then check that concurrent AsyncTrading.balances() calls are all accepted
+by the server, their nonces reaching it in order.
+
+    python benchmarks/bench_async.py [calls] [latency]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Public
+from bitfinex_async import AsyncPublic, AsyncTrading
+from mockserver import MockServer
+
+
+def run_sync(api_url, calls):
+    class LocalPublic(Public):
+        pass
+    LocalPublic.api_url = api_url
+
+    with LocalPublic() as client:
+        start = time.perf_counter()
+        for _ in range(calls):
+            client.ticker('BTCUSD')
+        return calls / (time.perf_counter() - start)
+
+
+async def run_async(api_url, calls, max_concurrency):
+    class LocalAsyncPublic(AsyncPublic):
+        pass
+    LocalAsyncPublic.api_url = api_url
+
+    async with LocalAsyncPublic(max_concurrency=max_concurrency) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[client.ticker('BTCUSD') for _ in range(calls)])
+        return calls / (time.perf_counter() - start)
+
+
+async def run_signed(server, calls):
+    class LocalAsyncTrading(AsyncTrading):
+        pass
+    LocalAsyncTrading.api_url = server.api_url
+
+    async with LocalAsyncTrading(server.key, server.secret) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*[client.balances() for _ in range(calls)],
+                                       return_exceptions=True)
+        elapsed = time.perf_counter() - start
+    failed = [result for result in results if isinstance(result, Exception)]
+    assert not failed, '%d signed calls failed: %s' % (len(failed), failed[0])
+    return calls / elapsed
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    with MockServer(latency=latency) as server:
+        print('sync:               %8.1f calls/sec' % run_sync(server.api_url, calls))
+        for max_concurrency in (10, 50):
+            rate = asyncio.run(run_async(server.api_url, calls, max_concurrency))
+            print('async (limit %3d):  %8.1f calls/sec' % (max_concurrency, rate))
+        rate = asyncio.run(run_signed(server, calls))
+        print('async signed:       %8.1f calls/sec, none rejected' % rate)
+    with MockServer() as server:
+        rate = asyncio.run(run_signed(server, calls))
+        print('async signed, no latency: %8.1f calls/sec, none rejected' % rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the memory and query latency of OrderBook against the list of
+dictionaries returned by Public.orderbook().
+
+    python benchmarks/bench_book.py [levels per side]
+"""
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex_book import OrderBook
+
+
+def make_response(levels):
+    random.seed(levels)
+    def side(start, step):
+        return [{'price': '%.2f' % (start + step * i),
+                 'amount': '%.8f' % random.uniform(0.01, 20),
+                 'timestamp': '1444253422.0'} for i in range(levels)]
+    return json.dumps({'bids': side(244.75, -0.01), 'asks': side(244.76, 0.01)})
+
+
+def measure(build):
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def dict_vwap(book, size):
+    remaining, cost = size, 0.0
+    for level in sorted(book['asks'], key=lambda level: float(level['price'])):
+        price, amount = float(level['price']), float(level['amount'])
+        if amount >= remaining:
+            return (cost + remaining * price) / size
+        cost += amount * price
+        remaining -= amount
+
+
+def dict_depth_at(book, price):
+    for level in book['bids']:
+        if float(level['price']) == price:
+            return float(level['amount'])
+    return 0.0
+
+
+def main():
+    levels = int(sys.argv[1]) if len(sys.argv) > 1 else 2500
+    payload = make_response(levels)
+
+    raw, raw_size = measure(lambda: json.loads(payload))
+    book, book_size = measure(lambda: OrderBook.from_response(raw))
+    print('%d levels per side' % levels)
+    print('memory      dicts %9d bytes   OrderBook %9d bytes' % (raw_size, book_size))
+
+    price = float(raw['bids'][levels // 2]['price'])
+    cases = [
+        ('best bid', lambda: max(float(l['price']) for l in raw['bids']), book.best_bid),
+        ('depth at', lambda: dict_depth_at(raw, price), lambda: book.depth_at(price, 'bids')),
+        ('vwap 100', lambda: dict_vwap(raw, 100), lambda: book.vwap(100, 'buy')),
+    ]
+    for name, on_dicts, on_book in cases:
+        number = 200
+        dicts = min(timeit.repeat(on_dicts, number=number, repeat=3)) / number
+        array = min(timeit.repeat(on_book, number=number, repeat=3)) / number
+        print('%-10s  dicts %9.2f us       OrderBook %9.2f us'
+              % (name, dicts * 1e6, array * 1e6))
+
+    previous = OrderBook.from_response(json.loads(make_response(levels)))
+    raw['bids'][0]['amount'] = '1.0'
+    current = OrderBook.from_response(raw)
+    print('diff        %d changed levels' % sum(map(len, current.diff(previous).values())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Time candles() over millions of synthetic trades, CandleBuilder over small
+batches, and a plain Python loop over trade dictionaries.
+
+    python benchmarks/bench_candles.py [millions of trades]
+"""
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex_candles import CandleBuilder, candles
+
+TRADE = numpy.dtype([('tid', '<i8'), ('timestamp', '<f8'), ('price', '<f8'),
+                     ('amount', '<f8'), ('type', 'i1')])
+
+
+def synthetic(count):
+    rng = numpy.random.RandomState(0)
+    trades = numpy.zeros(count, dtype=TRADE)
+    trades['tid'] = numpy.arange(count) + 11988919
+    trades['timestamp'] = 1444266681 + numpy.cumsum(rng.exponential(0.5, count))
+    trades['price'] = 244 + numpy.cumsum(rng.normal(0, 0.01, count))
+    trades['amount'] = rng.exponential(0.5, count)
+    trades['type'] = rng.choice([1, -1], count)
+    # Shuffle a little and repeat some trades, as polling does.
+    swap = rng.randint(0, count - 1, count // 100)
+    trades[swap], trades[swap + 1] = trades[swap + 1].copy(), trades[swap].copy()
+    return numpy.concatenate([trades, trades[rng.randint(0, count, count // 100)]])
+
+
+def python_candles(trades, interval):
+    bars = {}
+    seen = set()
+    for t in sorted(trades, key=lambda t: (float(t['timestamp']), t['tid'])):
+        if t['tid'] in seen:
+            continue
+        seen.add(t['tid'])
+        price, amount = float(t['price']), abs(float(t['amount']))
+        start = float(t['timestamp']) // interval * interval
+        bar = bars.get(start)
+        if bar is None:
+            bar = bars[start] = {'open': price, 'high': price, 'low': price,
+                                 'volume': 0.0, 'notional': 0.0,
+                                 'buy_volume': 0.0, 'sell_volume': 0.0}
+        bar['high'] = max(bar['high'], price)
+        bar['low'] = min(bar['low'], price)
+        bar['close'] = price
+        bar['volume'] += amount
+        bar['notional'] += price * amount
+        if t['type'] == 'buy':
+            bar['buy_volume'] += amount
+        elif t['type'] == 'sell':
+            bar['sell_volume'] += amount
+    return bars
+
+
+def main():
+    millions = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    trades = synthetic(int(millions * 1000000))
+
+    start = time.perf_counter()
+    bars = candles(trades, 60)
+    elapsed = time.perf_counter() - start
+    print('candles():       %d trades -> %d bars in %.2f s (%.1f M trades/s)'
+          % (len(trades), len(bars), elapsed, len(trades) / elapsed / 1e6))
+
+    sample = trades[:200000]
+    dicts = [{'tid': int(t['tid']), 'timestamp': '%.3f' % t['timestamp'],
+              'price': '%.2f' % t['price'], 'amount': '%.8f' % t['amount'],
+              'type': 'buy' if t['type'] > 0 else 'sell'} for t in sample]
+    start = time.perf_counter()
+    python_candles(dicts, 60)
+    elapsed = time.perf_counter() - start
+    print('python loop:     %d trade dicts in %.2f s (%.2f M trades/s)'
+          % (len(dicts), elapsed, len(dicts) / elapsed / 1e6))
+
+    builder = CandleBuilder(60)
+    start = time.perf_counter()
+    for index in range(0, len(sample), 500):
+        builder.update(sample[index:index + 500])
+    elapsed = time.perf_counter() - start
+    print('CandleBuilder:   %d trades in batches of 500 in %.2f s (%.2f M trades/s)'
+          % (len(sample), elapsed, len(sample) / elapsed / 1e6))
+    assert numpy.allclose(builder.candles().close, candles(sample, 60).close)
+
+
+if __name__ == '__main__':
+    main()
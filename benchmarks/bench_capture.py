@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Record a session of public and authenticated calls against the local
+server, replay it with no server to reach, and check that the replayed
+responses are those recorded. Then replay tickers on a virtual clock.
+
+    python benchmarks/bench_capture.py [calls]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import BitfinexError, Public, Trading
+from bitfinex_capture import CaptureFile, RecordTransport, ReplayTransport, VirtualClock
+from mockserver import TICKER, MockServer
+
+
+def session(client, calls):
+    """
+    Responses of ``calls`` rounds of calls.
+    """
+    responses = []
+    for index in range(calls):
+        responses.append(client.ticker('BTCUSD'))
+        responses.append(client.orderbook('BTCUSD', limit_bids=50, limit_asks=50))
+        responses.append(client.trades('BTCUSD', limit_trades=100))
+        responses.append(client.balances())
+        responses.append(client.offers())
+    return responses
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    logging.getLogger('bitfinex').setLevel(logging.CRITICAL)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'session.bfxcap')
+
+    with MockServer() as server:
+        class LocalTrading(Trading):
+            api_url = server.api_url
+        client = LocalTrading(server.key, server.secret, transport=RecordTransport(path))
+        start = time.perf_counter()
+        recorded = session(client, calls)
+        live = time.perf_counter() - start
+        client.close()
+        key, secret = server.key, server.secret
+
+    class NowhereTrading(Trading):
+        api_url = 'http://127.0.0.1:9/v1/'
+    client = NowhereTrading(key, secret, transport=ReplayTransport(path))
+    start = time.perf_counter()
+    replayed = session(client, calls)
+    replay = time.perf_counter() - start
+    client.close()
+    assert replayed == recorded, 'the replayed responses differ'
+
+    raw = sum(len(header['url']) + len(content) for header, content in CaptureFile(path))
+    size = os.path.getsize(path)
+    print('%d calls, replayed identical' % len(recorded))
+    print('capture: %d bytes, %.1fx smaller than the responses' % (size, float(raw) / size))
+    print('live:    %7.3f s, %7.0f calls/sec' % (live, len(recorded) / live))
+    print('replay:  %7.3f s, %7.0f calls/sec' % (replay, len(recorded) / replay))
+
+    # Tickers every simulated minute, replayed at the time of the clock.
+    path = os.path.join(directory, 'tickers.bfxcap')
+    with MockServer() as server:
+        class LocalPublic(Public):
+            api_url = server.api_url
+        minute = [1444000000]
+        client = LocalPublic(transport=RecordTransport(path, clock=lambda: minute[0]))
+        bids, bid = [], TICKER['bid']
+        for index in range(30):
+            TICKER['bid'] = '%.2f' % (240 + index)
+            bids.append(client.ticker('BTCUSD')['bid'])
+            minute[0] += 60
+        TICKER['bid'] = bid
+        client.close()
+
+    class NowherePublic(Public):
+        api_url = NowhereTrading.api_url
+    clock = VirtualClock()
+    client = NowherePublic(transport=ReplayTransport(path, clock=clock))
+    replayed = []
+    for index in range(30):
+        replayed.append(client.ticker('BTCUSD')['bid'])
+        clock.sleep(60)
+    client.close()
+    assert replayed == bids, 'the ticker replay is out of step with the clock'
+
+    # Before the first ticker recorded, there is none to replay.
+    client = NowherePublic(transport=ReplayTransport(path, clock=VirtualClock(1444000000 - 60)))
+    try:
+        client.ticker('BTCUSD')
+    except BitfinexError:
+        pass
+    else:
+        raise AssertionError('a ticker from the future was replayed')
+    client.close()
+    print('virtual clock: 30 minutes of tickers replayed in step, none early')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Time the decoding of book/, trades/ and history responses of realistic size
+with each installed json library and each numbers policy.
+
+    python benchmarks/bench_decode.py
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Public
+
+
+def payloads():
+    random.seed(0)
+    def level(price):
+        return {'price': '%.2f' % price, 'amount': '%.8f' % random.uniform(0.01, 20),
+                'timestamp': '%.1f' % (1444253422 + random.random())}
+    book = {'bids': [level(244.75 - 0.01 * i) for i in range(2500)],
+            'asks': [level(244.76 + 0.01 * i) for i in range(2500)]}
+    trades = [{'timestamp': 1444266681 - i, 'tid': 11988919 - i,
+               'price': '%.2f' % random.uniform(240, 250),
+               'amount': '%.8f' % random.uniform(0.01, 5),
+               'exchange': 'bitfinex', 'type': random.choice(['sell', 'buy'])}
+              for i in range(1000)]
+    history = [{'currency': 'USD', 'amount': '%.8f' % random.uniform(-10, 10),
+                'balance': '%.8f' % random.uniform(0, 1000),
+                'description': 'Swap Payment on wallet deposit',
+                'timestamp': '%.1f' % (1444266681 - 3600 * i)}
+               for i in range(500)]
+    return [('book 2x2500', book), ('trades 1000', trades),
+            ('history 500', history)]
+
+
+def decoders():
+    yield 'json', json.loads
+    for name in ('orjson', 'ujson'):
+        try:
+            yield name, __import__(name).loads
+        except ImportError:
+            pass
+
+
+def main():
+    for name, response in payloads():
+        content = json.dumps(response).encode('utf-8')
+        print('%s (%d kB)' % (name, len(content) // 1024))
+        for decoder_name, loads in decoders():
+            for numbers in ('str', 'float', 'decimal'):
+                client = Public(json_loads=loads, numbers=numbers)
+                number = 20
+                elapsed = min(timeit.repeat(lambda: client._decode_json(content),
+                                            number=number, repeat=3)) / number
+                print('  %-7s numbers=%-8s %8.2f ms' % (decoder_name, numbers,
+                                                        elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
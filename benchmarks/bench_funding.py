@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Reprice funding offers against the local server with 20 ms of latency: one
+request at a time with offer_status polling, as a lending bot would, then
+with OfferManager.
+
+    python benchmarks/bench_funding.py [offers]
+"""
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Trading
+from bitfinex_funding import OfferManager
+from mockserver import MockServer
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    logging.getLogger('bitfinex').setLevel(logging.CRITICAL)
+    with MockServer(latency=0.02) as server:
+        class LocalTrading(Trading):
+            api_url = server.api_url
+        client = LocalTrading(server.key, server.secret, pool_maxsize=16)
+
+        ids = [client.offer_new('USD', 50, 10, 2, 'lend')['id'] for _ in range(count)]
+        start = time.perf_counter()
+        for offer_id in ids:
+            client.offer_cancel(offer_id)
+            client.offer_status(offer_id)
+            offer = client.offer_new('USD', 50, 11, 2, 'lend')
+            client.offer_status(offer['id'])
+        serial = time.perf_counter() - start
+        print('serial:        %7.3f s for %d offers' % (serial, count))
+
+        manager = OfferManager(client, 'USD', workers=16)
+        start = time.perf_counter()
+        manager.reconcile()
+        reconcile = time.perf_counter() - start
+        report = manager.reprice(lambda offer: 12)
+        start = time.perf_counter()
+        manager.reconcile()
+        reconcile = (reconcile + time.perf_counter() - start) / 2
+        print('OfferManager:  %7.3f s (cancel %.3f s, submit %.3f s), '
+              'reconcile %.3f s' % (report.latency, report.cancel_latency,
+                                    report.submit_latency, reconcile))
+        print('%d cancelled, %d created, %d errors, %d resent for their nonce, '
+              '%d live offers at 12%%' % (
+                  len(report.cancelled), len(report.created), len(report.errors),
+                  report.retries,
+                  sum(1 for offer in manager.offers.values() if float(offer['rate']) == 12)))
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the overhead of Instrumentation on BaseClient._request, using a
+transport function that returns a prepared response without any network.
+
+    python benchmarks/bench_instrumentation.py [calls]
+"""
+import datetime
+import json
+import os
+import sys
+import timeit
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Instrumentation, Public
+from mockserver import TICKER
+
+
+def prepared_response():
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response._content = json.dumps(TICKER).encode('utf-8')
+    response.elapsed = datetime.timedelta(microseconds=100)
+    return response
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    response = prepared_response()
+
+    def get(url, **kwargs):
+        return response
+
+    disabled = Public()
+    enabled = Public(instrumentation=Instrumentation())
+    hooked = Public(instrumentation=Instrumentation())
+    hooked.instrumentation.add_hook(before=lambda *args: None,
+                                    after=lambda *args: None)
+
+    def bare():
+        # The work of _request without any instrumentation check.
+        r = get(disabled.api_url + 'pubticker/btcusd')
+        disabled._raise_for_status(r.status_code, r.reason, r.url)
+        return disabled._decode_json(r.content)
+
+    bare_time = min(timeit.repeat(bare, number=calls, repeat=3)) / calls
+    print('%-16s %7.2f us/call' % ('bare', bare_time * 1e6))
+
+    timings = []
+    for name, client in (('disabled', disabled), ('enabled', enabled),
+                         ('enabled + hooks', hooked)):
+        elapsed = min(timeit.repeat(
+            lambda: client._request(get, 'pubticker/btcusd', return_json=True),
+            number=calls, repeat=3)) / calls
+        timings.append(elapsed)
+        print('%-16s %7.2f us/call' % (name, elapsed * 1e6))
+    print('whole _request wrapper when disabled: %.2f us/call' % ((timings[0] - bare_time) * 1e6))
+    print('overhead when enabled: %.2f us/call' % ((timings[1] - timings[0]) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
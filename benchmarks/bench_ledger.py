@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Follow the wallets of the local server while entries are booked to them,
+once by pulling the balances and the ledger of every currency at each
+round, as a reconciliation loop would, and once with WalletTracker, and
+check that the tracked view ends up equal to the balances.
+
+    python benchmarks/bench_ledger.py [rounds]
+"""
+import logging
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Instrumentation, Trading
+from bitfinex_ledger import WalletTracker
+from mockserver import CURRENCIES, MockServer
+
+WALLETS = ('trading', 'exchange', 'deposit')
+
+
+def book(server, rng):
+    """
+    Book up to two entries, as a round of account activity.
+    """
+    for _ in range(rng.choice((0, 0, 1, 2))):
+        server.exchange.book_entry(rng.choice(CURRENCIES).upper(), rng.choice(WALLETS),
+                                   round(rng.uniform(-5, 5), 4), 'Trade')
+
+
+def report(name, instrumentation, elapsed, rounds):
+    requests = sum(instrumentation.requests.values())
+    received = sum(instrumentation.bytes_received.values())
+    print('%-12s %7.3f s, %5.1f ms/round, %4d requests, %7.1f kB received' % (
+        name, elapsed, elapsed * 1000 / rounds, requests, received / 1000.0))
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    logging.getLogger('bitfinex').setLevel(logging.CRITICAL)
+    with MockServer(latency=0.005) as server:
+        class LocalTrading(Trading):
+            api_url = server.api_url
+
+        rng = random.Random(0)
+        instrumentation = Instrumentation()
+        client = LocalTrading(server.key, server.secret, check_credentials=False,
+                              instrumentation=instrumentation)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            book(server, rng)
+            client.balances()
+            for currency in CURRENCIES:
+                client.historical_balance(currency)
+        report('full pulls:', instrumentation, time.perf_counter() - start, rounds)
+
+        for workers in (1, 4):
+            instrumentation = Instrumentation()
+            client = LocalTrading(server.key, server.secret, check_credentials=False,
+                                  instrumentation=instrumentation)
+            # A check every 20 rounds, on a clock moving a second a round.
+            now = [0.0]
+            tracker = WalletTracker(client, verify_every=20, workers=workers,
+                                    clock=lambda: now[0] + time.time())
+            changes = []
+            tracker.on_change(lambda *change: changes.append(change))
+            start = time.perf_counter()
+            tracker.start()
+            for _ in range(rounds):
+                book(server, rng)
+                tracker.poll()
+                now[0] += 1
+            report('tracker x%d:' % workers, instrumentation,
+                   time.perf_counter() - start, rounds)
+
+            tracker.verify_every = None
+            tracker.poll()
+            drift = tracker.verify()
+            expected = dict(((balance['type'], balance['currency'].upper()),
+                             float(balance['amount'])) for balance in client.balances())
+            tracked = dict(((balance['type'], balance['currency'].upper()),
+                            float(balance['amount'])) for balance in tracker.snapshot())
+            assert tracked == expected and not drift, 'the tracked balances differ'
+            print('    %d changes notified, %d entries read, %d checks, %d drifted' % (
+                len(changes), tracker.stats['entries'], tracker.stats['checks'],
+                tracker.stats['drift']))
+
+        number = 1000000
+        read = timeit.timeit(lambda: tracker.balance('USD', 'deposit'), number=number)
+        print('balance read: %.0f ns' % (read * 1e9 / number))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Compare trade dictionaries, as decoded from the API, with Trade records:
+memory held, reading a price, and building columns.
+
+    python benchmarks/bench_models.py [trades]
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex_models import Trade
+
+TRADE = ('{"timestamp": %d, "tid": %d, "price": "244.%02d", '
+         '"amount": "0.%04d", "exchange": "bitfinex", "type": "sell"}')
+
+
+def held(build):
+    """
+    Bytes allocated by ``build()`` and still held by its result.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    body = '[%s]' % ','.join(TRADE % (1444000000 + index, index, index % 100, index % 10000)
+                             for index in range(count))
+
+    dicts, dict_size = held(lambda: json.loads(body))
+    records, record_size = held(lambda: Trade.from_response(json.loads(body)))
+    columns, column_size = held(lambda: records.columns())
+    print('memory:   dicts %6.1f MB, records %6.1f MB (%.1fx less), '
+          'numeric columns %5.1f MB' % (dict_size / 1e6, record_size / 1e6,
+                                       float(dict_size) / record_size, column_size / 1e6))
+    decoded = json.loads(body)
+    convert = timeit.timeit(lambda: Trade.from_response(decoded), number=3) / 3
+    print('build:    %.3f s for %d records, %.2f us each' % (convert, count, convert * 1e6 / count))
+
+    record = records[0]
+    trade = dicts[0]
+    number = 1000000
+    dict_read = timeit.timeit(lambda: float(trade['price']), number=number)
+    record_read = timeit.timeit(lambda: record.price, number=number)
+    print('read:     float(d["price"]) %4.0f ns, record.price %4.0f ns (%.1fx faster)' % (
+        dict_read * 1e9 / number, record_read * 1e9 / number, dict_read / record_read))
+
+    fresh = Trade.from_response(json.loads(body))
+    first = timeit.timeit(lambda: [trade.price for trade in fresh], number=1)
+    through = timeit.timeit(lambda: [float(trade['price']) for trade in dicts], number=1)
+    print('scan:     dicts %.3f s, fresh records %.3f s' % (through, first))
+
+    build = timeit.timeit(lambda: [float(trade['price']) for trade in dicts], number=3) / 3
+    columns = timeit.timeit(lambda: records.columns('price'), number=3) / 3
+    del decoded
+    print('columns:  list of floats from dicts %.3f s, records.columns %.3f s' % (build, columns))
+
+
+if __name__ == '__main__':
+    main()
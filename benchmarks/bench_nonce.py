@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Stress NonceGenerator from several processes sharing one state file, each
+with several threads, and check that the nonces are unique and increasing.
+Then send signed requests from several threads through one client and
+check that the local server accepts all their nonces.
+
+    python benchmarks/bench_nonce.py [processes] [threads] [nonces per thread]
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from concurrent.futures import ThreadPoolExecutor
+
+from bitfinex import BitfinexError, NonceGenerator, Trading
+from mockserver import MockServer
+
+
+def worker(state_file, threads, count, queue):
+    generator = NonceGenerator(state_file)
+    sequences = [[] for _ in range(threads)]
+
+    def run(sequence):
+        for _ in range(count):
+            sequence.append(generator.next())
+
+    pool = [threading.Thread(target=run, args=(sequence,))
+            for sequence in sequences]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    queue.put(sequences)
+
+
+def send(nonce_generator, threads, calls):
+    """
+    Number of ``calls`` to balances(), made from ``threads`` threads through
+    one client, rejected by the local server.
+    """
+    with MockServer(latency=0.001) as server:
+        class LocalTrading(Trading):
+            api_url = server.api_url
+        client = LocalTrading(server.key, server.secret,
+                              nonce_generator=nonce_generator)
+
+        def call(index):
+            try:
+                client.balances()
+            except BitfinexError:
+                return 1
+            return 0
+        with ThreadPoolExecutor(threads) as executor:
+            rejected = sum(executor.map(call, range(calls)))
+        client.close()
+    return rejected
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    state_file = os.path.join(tempfile.mkdtemp(), 'nonce')
+
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker,
+                                       args=(state_file, threads, count, queue))
+               for _ in range(processes)]
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+    sequences = [sequence for _ in workers for sequence in queue.get()]
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    nonces = [nonce for sequence in sequences for nonce in sequence]
+    for sequence in sequences:
+        assert all(a < b for a, b in zip(sequence, sequence[1:])), 'not increasing'
+    assert len(set(nonces)) == len(nonces), 'duplicated nonces'
+    # A restarted process carries on from the stored high-water mark.
+    assert NonceGenerator(state_file).next() > max(nonces), 'reused after restart'
+
+    print('%d processes x %d threads: %d unique increasing nonces, %.0f nonces/sec'
+          % (processes, threads, len(nonces), len(nonces) / elapsed))
+
+    generator = NonceGenerator()
+    start = time.perf_counter()
+    for _ in range(100000):
+        generator.next()
+    print('in-process generator: %.0f nonces/sec'
+          % (100000 / (time.perf_counter() - start)))
+    os.remove(state_file)
+    os.rmdir(os.path.dirname(state_file))
+
+    logging.getLogger('bitfinex').setLevel(logging.CRITICAL)
+    rejected = send(NonceGenerator(serialize=False), 16, 400)
+    print('16 threads, one client, requests sent at once: %d of 400 rejected'
+          % rejected)
+    rejected = send(None, 16, 400)
+    assert rejected == 0, '%d requests rejected for their nonce' % rejected
+    print('16 threads, one client, default nonces: all 400 accepted')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Read balances, offers, credits and history from 16 threads through
+pools of 1 to 8 keys, against the local server limiting each key to 50
+signed requests per second, then from 4 worker processes sharing the
+nonces of 2 keys.
+
+    python benchmarks/bench_pool.py [calls]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Trading
+from bitfinex_pool import TradingPool
+from mockserver import EPOCH, MockServer
+
+RATE = 50
+# The pool keeps a little under the limit of the server, whose clock runs
+# apart.
+LIMIT = (4, 4.0 / (RATE * 0.95))
+
+
+class LocalTrading(Trading):
+    api_url = None
+
+
+def summary(stats):
+    return '%d resent, %d rate limited, %d errors' % tuple(
+        sum(stat[name] for stat in stats) for name in ('resent', 'rate_limited', 'errors'))
+
+
+def work(pool, index):
+    method = ('balances', 'offers', 'credits', 'taken_funds')[index % 4]
+    if index % 5 == 4:
+        return len(pool.historical_balance('USD', since=EPOCH, limit=50))
+    return len(getattr(pool, method)())
+
+
+def run(pool, calls, workers=16):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(lambda index: work(pool, index), range(calls)))
+    return time.perf_counter() - start
+
+
+def process_work(args):
+    pool, calls = args
+    run(pool, calls, workers=4)
+    return pool.stats()
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    logging.getLogger('bitfinex').setLevel(logging.CRITICAL)
+    with MockServer(latency=0.005, keys=8, key_rate=RATE, key_burst=4) as server:
+        LocalTrading.api_url = server.api_url
+        baseline = None
+        for keys in (1, 2, 4, 8):
+            for strategy in ('least_loaded', 'budget'):
+                with TradingPool(server.credentials[:keys], strategy, limit=LIMIT,
+                                 client_class=LocalTrading, pool_maxsize=16) as pool:
+                    elapsed = run(pool, calls)
+                    stats = pool.stats().values()
+                rate = calls / elapsed
+                baseline = baseline or rate
+                print('%d keys, %-12s %7.3f s, %6.0f calls/sec, %4.1fx, %s' % (
+                    keys, strategy, elapsed, rate, rate / baseline, summary(stats)))
+
+        # Each process uses both keys, with a quarter of their limit.
+        nonce_dir = tempfile.mkdtemp()
+        pool = TradingPool(server.credentials[:2], limit=(1, LIMIT[1]),
+                           nonce_dir=nonce_dir, client_class=LocalTrading)
+        start = time.perf_counter()
+        with ProcessPoolExecutor(4) as executor:
+            results = list(executor.map(process_work, [(pool, calls // 4)] * 4))
+        elapsed = time.perf_counter() - start
+        pool.close()
+        print('4 processes, 2 keys: %7.3f s, %6.0f calls/sec, %s' % (
+            elapsed, calls / elapsed,
+            summary([stat for stats in results for stat in stats.values()])))
+
+
+if __name__ == '__main__':
+    main()
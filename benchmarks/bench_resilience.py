@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Run Public.ticker() against a local server injecting faults, with and
+without the retry, hedging and circuit breaker policies.
+
+    python benchmarks/bench_resilience.py [calls]
+"""
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import (BitfinexError, CircuitBreaker, HedgePolicy, Public,
+                      RetryPolicy, SymbolRegistry)
+from mockserver import SYMBOLS, MockServer
+
+# The symbols are not requested from the faulty server.
+REGISTRY = SymbolRegistry()
+REGISTRY.update(SYMBOLS)
+
+
+def client_for(server, **kwargs):
+    class LocalPublic(Public):
+        pass
+    LocalPublic.api_url = server.api_url
+    return LocalPublic(symbol_registry=REGISTRY, **kwargs)
+
+
+def run(client, calls):
+    latencies, errors = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            client.ticker('BTCUSD')
+        except BitfinexError:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return (errors, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000, sum(latencies))
+
+
+def report(name, result):
+    print('  %-22s errors %4d   p50 %7.1f ms   p99 %7.1f ms   total %6.2f s'
+          % ((name,) + result))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    logging.getLogger('bitfinex').setLevel(logging.CRITICAL)
+
+    print('20% of the requests answered with HTTP 503')
+    with MockServer(failure_rate=0.2) as server:
+        report('no retry', run(client_for(server), calls))
+        report('RetryPolicy', run(client_for(
+            server, retry=RetryPolicy(retries=3, backoff=0.005)), calls))
+
+    print('3% of the requests stalled for 300 ms')
+    with MockServer(latency=0.005, stall_rate=0.03, stall=0.3) as server:
+        report('no hedging', run(client_for(server), calls))
+        hedging = HedgePolicy(quantile=0.9, min_samples=20)
+        report('HedgePolicy', run(client_for(server, hedging=hedging), calls))
+        print('  %d requests hedged' % hedging.hedged)
+        hedging.close()
+
+    print('every request stalled for 2 s, read timeout of 0.2 s')
+    with MockServer(stall_rate=1.0, stall=2.0) as server:
+        report('timeout', run(client_for(server, timeout=(1, 0.2)), 10))
+        report('timeout + breaker', run(client_for(
+            server, timeout=(1, 0.2),
+            circuit_breaker=CircuitBreaker(failure_threshold=3)), 10))
+
+
+if __name__ == '__main__':
+    main()
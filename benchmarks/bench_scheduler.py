@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Check the RequestScheduler on a simulated clock, without any request or
+real wait: the refill of a group, the order of the waiting requests by
+priority, and the depth and wait statistics.
+
+    python benchmarks/bench_scheduler.py
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import RequestScheduler
+
+
+class SimulatedTime(object):
+    """
+    Clock moved only by ``sleep``, which returns once ``gate`` is set at the
+    time it was called plus the delay, so that threads sleeping at once all
+    wake up at the time they asked for whatever their order.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleepers = 0
+        self.gate = threading.Event()
+        self._cond = threading.Condition()
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self._cond:
+            target = self.now + seconds
+            self.sleepers += 1
+            self._cond.notify_all()
+        self.gate.wait()
+        with self._cond:
+            self.now = max(self.now, target)
+
+    def wait_sleepers(self, count):
+        with self._cond:
+            while self.sleepers < count:
+                self._cond.wait(5)
+
+
+def check_refill():
+    time = SimulatedTime()
+    time.gate.set()
+    scheduler = RequestScheduler(limits={'book/': (3, 3)}, clock=time.clock,
+                                 sleep=time.sleep)
+    waits = [scheduler.acquire('book/btcusd') for index in range(4)]
+    assert waits == [0.0, 0.0, 0.0, 1.0], waits
+    # Idle time refills the bucket up to its capacity only.
+    time.now += 60
+    waits = [scheduler.acquire('book/btcusd') for index in range(4)]
+    assert waits == [0.0, 0.0, 0.0, 1.0], waits
+    stats = scheduler.stats()['book/']
+    assert stats == {'depth': 0, 'max_depth': 1, 'requests': 8,
+                     'wait_time': 2.0, 'max_wait': 1.0}, stats
+    print('refill: 3 at once, then 1 per second, capped after idle time')
+
+
+def check_priorities():
+    time = SimulatedTime()
+    scheduler = RequestScheduler(limits={'auth': (1, 0.5)}, clock=time.clock,
+                                 sleep=time.sleep)
+    scheduler.acquire('balances', 'POST')
+    waits = {}
+
+    def acquire(url):
+        waits[url] = scheduler.acquire(url, 'POST')
+
+    # Queued from the lowest priority to the highest, each one sleeping
+    # for the next token before the next is queued.
+    threads = []
+    for count, url in enumerate(('history', 'offers', 'offer/cancel'), 1):
+        thread = threading.Thread(target=acquire, args=(url,))
+        thread.start()
+        threads.append(thread)
+        time.wait_sleepers(count)
+    assert scheduler.stats()['auth']['depth'] == 3
+    time.gate.set()
+    for thread in threads:
+        thread.join()
+
+    # One token every half second, given by order of priority.
+    assert waits == {'offer/cancel': 0.5, 'offers': 1.0, 'history': 1.5}, waits
+    stats = scheduler.stats()['auth']
+    assert stats == {'depth': 0, 'max_depth': 3, 'requests': 4,
+                     'wait_time': 3.0, 'max_wait': 1.5}, stats
+    print('priorities: offer/cancel, then offers, then history, '
+          'queued in the opposite order')
+
+
+def main():
+    check_refill()
+    check_priorities()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Compare calls/sec of Public.ticker() with a pooled keep-alive session against
+a session that opens a new connection for every call, over HTTPS like the
+real API: first on localhost, where only the TLS handshake is saved, then
+with the round trips of the TCP and TLS handshakes of a distant server.
+
+    python benchmarks/bench_session.py [calls] [connect latency]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Public
+from mockserver import MockServer
+
+
+def run(server, calls, keep_alive):
+    class LocalPublic(Public):
+        pass
+    LocalPublic.api_url = server.api_url
+
+    with LocalPublic(keep_alive=keep_alive) as client:
+        # Else a CA bundle of the environment overrides the certificate.
+        client.session.trust_env = False
+        client.session.verify = server.certfile
+        start = time.perf_counter()
+        for _ in range(calls):
+            client.ticker('BTCUSD')
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    connect_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    for label, latency, count in (('localhost', 0.0, calls),
+                                  ('%.0f ms handshakes' % (connect_latency * 1000),
+                                   connect_latency, calls // 10)):
+        with MockServer(tls=True, connect_latency=latency) as server:
+            unpooled = run(server, count, keep_alive=False)
+            pooled = run(server, count, keep_alive=True)
+        print('%s, https:' % label)
+        print('  unpooled: %8.1f calls/sec' % unpooled)
+        print('  pooled:   %8.1f calls/sec' % pooled)
+        print('  speedup:  %8.2fx' % (pooled / unpooled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Check that Signer gives the same headers as the signing code it replaced,
+then compare the time to sign a request with both.
+
+    python benchmarks/bench_signer.py [requests]
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Signer, Trading
+from mockserver import MockServer
+
+KEY, SECRET = 'key', 'secret'
+
+PAYLOADS = [
+    ('account_infos', {'nonce': '1444253422348340'}),
+    ('offer/new', {'nonce': '1444253422348341', 'currency': 'USD',
+                   'amount': '50.0', 'rate': '12.5', 'period': 2,
+                   'direction': 'lend'}),
+    ('offer/cancel', {'nonce': '1444253422348342', 'offer_id': 12345}),
+    ('history', {'nonce': '1444253422348343', 'currency': 'BTC',
+                 'since': 1444000000.5, 'limit': 500, 'wallet': u'd\xe9p\xf4t'}),
+    ('mytrades', {'nonce': '1444253422348344', 'symbol': 'BTCUSD',
+                  'timestamp': 0, 'reverse': 1}),
+]
+
+
+def legacy_headers(path, data):
+    # BaseClient._auth_headers before Signer.
+    msg = {'request': '/v1/' + path}
+    msg.update(data)
+    payload = base64.standard_b64encode(json.dumps(msg).encode('utf-8'))
+    signature = hmac.new(SECRET.encode('utf-8'), msg=payload,
+                         digestmod=hashlib.sha384).hexdigest()
+    return {'X-BFX-APIKEY': KEY,
+            'X-BFX-PAYLOAD': payload.decode('ascii'),
+            'X-BFX-SIGNATURE': signature}
+
+
+def check():
+    legacy = Signer(KEY, SECRET, compact=False)
+    compact = Signer(KEY, SECRET)
+    for path, data in PAYLOADS:
+        assert legacy.sign(path, dict(data)) == legacy_headers(path, data), path
+
+        headers = compact.sign(path, dict(data))
+        payload = headers['X-BFX-PAYLOAD'].encode('ascii')
+        decoded = json.loads(base64.standard_b64decode(payload).decode('utf-8'))
+        expected = dict(data, request='/v1/' + path)
+        assert decoded == expected, path
+        assert headers['X-BFX-SIGNATURE'] == hmac.new(
+            SECRET.encode('utf-8'), payload, hashlib.sha384).hexdigest(), path
+        # Same bytes whatever the order of the fields.
+        reordered = dict(reversed(list(data.items())))
+        assert compact.sign(path, reordered) == headers, path
+
+    # Accepted by the stand-in server, which checks the signatures.
+    with MockServer() as server:
+        class LocalTrading(Trading):
+            api_url = server.api_url
+        client = LocalTrading(server.key, server.secret)
+        signed = client.presign([('offer/new', {'currency': 'USD', 'amount': '50.0',
+                                                'rate': '12.5', 'period': 2,
+                                                'direction': 'lend'})] * 10)
+        offers = [client.post_presigned(path, headers) for path, headers in signed]
+        assert len(set(offer['id'] for offer in offers)) == 10
+        client.close()
+    print('signatures match')
+
+
+def timed(sign, count):
+    path, data = PAYLOADS[1]
+    start = time.perf_counter()
+    for _ in range(count):
+        sign(path, dict(data))
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    check()
+    legacy = timed(legacy_headers, count)
+    print('previous signing:      %6.2f us/request' % legacy)
+    for name, signer in (('Signer(compact=False)', Signer(KEY, SECRET, compact=False)),
+                         ('Signer()', Signer(KEY, SECRET))):
+        elapsed = timed(signer.sign, count)
+        print('%-22s %6.2f us/request (%.2fx)' % (name + ':', elapsed, legacy / elapsed))
+
+    signer = Signer(KEY, SECRET)
+    path, data = PAYLOADS[1]
+    batch = [(path, dict(data, nonce=str(nonce))) for nonce in range(1000)]
+    start = time.perf_counter()
+    signer.sign_batch(batch)
+    print('sign_batch of 1000:    %6.2f ms' % ((time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Replay a recording of the BTCUSD ticker, book and trades channels to a
+Stream through the local websocket stand-in, once as is and once with a
+missing message, a wrong checksum and a lost connection, and check that
+the local book, trades and ticker end up as recorded.
+
+    python benchmarks/bench_stream.py [book updates]
+"""
+import asyncio
+import collections
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import Public
+from bitfinex_async import AsyncPublic
+from bitfinex_stream import Stream
+from mockserver import MockServer
+from wsserver import WebsocketServer, final_state, generate
+
+
+async def replay(recording, rest_client=None, failing_callback=False, **faults):
+    bids, asks, tids, ticker = final_state(recording)
+    counts = collections.Counter()
+
+    def counter(kind):
+        def count(symbol, data):
+            counts[kind] += 1
+        return count
+
+    async with WebsocketServer(recording, **faults) as server:
+        stream = Stream(server.url, rest_client=rest_client,
+                        reconnect_delay=0.05, trade_buffer=len(tids) * 2)
+        book = stream.subscribe_book('BTCUSD')
+        trades = stream.subscribe_trades('BTCUSD')
+        stream.subscribe_ticker('BTCUSD')
+        stream.on('book', counter('book'))
+        stream.on('ticker', counter('ticker'))
+        if failing_callback:
+            stream.on('book', lambda symbol, data: 1 / 0)
+        updates = stream.updates('trades', 'BTCUSD', maxsize=len(tids) * 2)
+
+        start = time.perf_counter()
+        await stream.start()
+        deadline = start + 60
+        while time.perf_counter() < deadline:
+            received = set(trade['tid'] for trade in trades)
+            if (book.synced and book.bids == bids and book.asks == asks
+                    and tids <= received and stream.tickers.get('BTCUSD', {}).get('bid') == ticker[0]):
+                break
+            await asyncio.sleep(0.01)
+        else:
+            raise AssertionError('the stream did not converge: %r' % stream.stats)
+        elapsed = time.perf_counter() - start
+        await stream.close()
+
+    iterated = updates.queue.qsize()
+    print('  %d messages in %.3f s, %.0f messages/sec' % (
+        stream.stats['messages'], elapsed, stream.stats['messages'] / elapsed))
+    print('  callbacks: %d book, %d ticker; %d trades iterated'
+          % (counts['book'], counts['ticker'], iterated))
+    errors = ', '.join('%s %d' % item for item in sorted(stream.stats.items())
+                       if item[0] != 'messages')
+    print('  stats: ' + (errors or 'no errors'))
+    return stream.stats
+
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    logging.getLogger('bitfinex').setLevel(logging.CRITICAL)
+    recording = generate('BTCUSD', updates=updates)
+    loop = asyncio.new_event_loop()
+    print('replay')
+    loop.run_until_complete(replay(recording))
+    print('replay with faults, REST fallback')
+    with MockServer() as server:
+        class LocalPublic(Public):
+            api_url = server.api_url
+        rest_client = LocalPublic()
+        loop.run_until_complete(replay(recording, rest_client, gap_after=updates // 3,
+                                       corrupt_after=updates // 2,
+                                       drop_after=updates))
+        rest_client.close()
+    print('replay with faults, async REST fallback')
+    with MockServer() as server:
+        class LocalAsyncPublic(AsyncPublic):
+            api_url = server.api_url
+        rest_client = LocalAsyncPublic()
+        stats = loop.run_until_complete(replay(
+            recording, rest_client, gap_after=updates // 3,
+            corrupt_after=updates // 2, drop_after=updates))
+        loop.run_until_complete(rest_client.close())
+        assert not stats.get('rest_errors'), 'the REST fallback failed'
+    print('replay with a failing callback and a frame which is not json')
+    stats = loop.run_until_complete(replay(recording, failing_callback=True,
+                                           garbage_after=updates // 4))
+    assert stats['bad_messages'] == 1 and stats['callback_errors'] > 0, stats
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark every endpoint of the clients against the local stand-in server,
+reporting calls/sec, p50/p99 latency and memory per method.
+
+    python benchmarks/bench_suite.py [--calls 200] [--latency 0.001]
+        [--failure-rate 0.05] [--only history] [--json results.json]
+        [--baseline previous.json --tolerance 0.3]
+
+With ``--baseline``, the run is compared with the json output of a previous
+one and exits with status 1 if a method got slower (calls/sec or p99) or
+allocates more than ``tolerance`` times its baseline, so that CI catches
+regressions. Memory is measured with tracemalloc in a separate, shorter
+run, since tracing slows the calls down.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bitfinex import BitfinexError, Trading
+from mockserver import EPOCH, MockServer
+
+
+def cases(server):
+    """
+    (name, call) of the benchmarked methods, ``call(client, index)`` making
+    one call.
+    """
+    exchange = server.exchange
+    offer_ids = []
+
+    def offer_cancel(client, index):
+        # Cancel offers created beforehand, without going through the API.
+        if not offer_ids:
+            offer_ids.extend(exchange.post_offer_new(
+                {'currency': 'USD', 'amount': '50.0', 'rate': '10.0',
+                 'period': 2, 'direction': 'lend'})['id'] for _ in range(1000))
+        return client.offer_cancel(offer_ids.pop())
+
+    def offer_status(client, index):
+        if not exchange.offers:
+            exchange.post_offer_new({'currency': 'USD', 'amount': '50.0',
+                                     'rate': '10.0', 'period': 2,
+                                     'direction': 'lend'})
+        return client.offer_status(next(iter(exchange.offers)))
+
+    middle = EPOCH + 7 * 1000
+    return [
+        ('ticker', lambda c, i: c.ticker('BTCUSD')),
+        ('stats', lambda c, i: c.stats('BTCUSD')),
+        ('orderbook', lambda c, i: c.orderbook('BTCUSD')),
+        ('fundingbook', lambda c, i: c.fundingbook('USD')),
+        ('trades', lambda c, i: c.trades('BTCUSD', middle)),
+        ('lends', lambda c, i: c.lends('USD', EPOCH)),
+        ('account_infos', lambda c, i: c.account_infos()),
+        ('historical_balance', lambda c, i: c.historical_balance('USD')),
+        ('historical_movements', lambda c, i: c.historical_movements('BTC')),
+        ('past_trades', lambda c, i: c.past_trades('BTCUSD', EPOCH)),
+        ('offer_new', lambda c, i: c.offer_new('USD', 50, 10, 2, 'lend')),
+        ('offer_status', offer_status),
+        ('offer_cancel', offer_cancel),
+        ('offers', lambda c, i: c.offers()),
+        ('credits', lambda c, i: c.credits()),
+        ('taken_funds', lambda c, i: c.taken_funds()),
+        ('balances', lambda c, i: c.balances()),
+        ('iter_historical_balance',
+         lambda c, i: sum(1 for _ in c.iter_historical_balance('USD', limit=500))),
+    ]
+
+
+def measure(client, call, calls):
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for index in range(calls):
+        begin = time.perf_counter()
+        try:
+            call(client, index)
+        except BitfinexError:
+            errors += 1
+        latencies.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {'calls_per_sec': calls / elapsed,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+            'errors': errors}
+
+
+def measure_memory(client, call, calls):
+    """
+    Peak memory allocated while making the calls, and memory still allocated
+    after them, in bytes per call.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for index in range(calls):
+            try:
+                call(client, index)
+            except BitfinexError:
+                pass
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_kb': (peak - before) / 1024.0,
+            'retained_per_call': (current - before) / float(calls)}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Descriptions of the regressions of ``results`` against ``baseline``.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['calls_per_sec'] < previous['calls_per_sec'] * (1 - tolerance):
+            regressions.append('%s: %.0f calls/sec, was %.0f' % (
+                name, result['calls_per_sec'], previous['calls_per_sec']))
+        if result['p99_ms'] > previous['p99_ms'] * (1 + tolerance):
+            regressions.append('%s: p99 %.2f ms, was %.2f' % (
+                name, result['p99_ms'], previous['p99_ms']))
+        if result['peak_kb'] > previous['peak_kb'] * (1 + tolerance) + 16:
+            regressions.append('%s: peak %.1f kB, was %.1f' % (
+                name, result['peak_kb'], previous['peak_kb']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--memory-calls', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the server waits before answering')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='share of the requests answered with HTTP 503')
+    parser.add_argument('--only', help='regular expression of the methods to run')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    args = parser.parse_args()
+    logging.getLogger('bitfinex').setLevel(logging.CRITICAL)
+
+    results = {}
+    with MockServer(latency=args.latency, failure_rate=args.failure_rate) as server:
+        class LocalTrading(Trading):
+            pass
+        LocalTrading.api_url = server.api_url
+        client = LocalTrading(server.key, server.secret, check_credentials=False)
+        client.symbols
+
+        print('%-24s %10s %9s %9s %8s %10s %12s' % (
+            'method', 'calls/sec', 'p50 ms', 'p99 ms', 'errors', 'peak kB',
+            'retained B'))
+        for name, call in cases(server):
+            if args.only and not re.search(args.only, name):
+                continue
+            call(client, 0)  # warm up
+            result = measure(client, call, args.calls)
+            result.update(measure_memory(client, call, args.memory_calls))
+            results[name] = result
+            print('%-24s %10.1f %9.2f %9.2f %8d %10.1f %12.1f' % (
+                name, result['calls_per_sec'], result['p50_ms'],
+                result['p99_ms'], result['errors'], result['peak_kb'],
+                result['retained_per_call']))
+        client.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
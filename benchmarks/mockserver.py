@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Bitfinex v1 REST API, used by the benchmarks so they
+never touch the real exchange.
+
+It serves the public endpoints used by :mod:`bitfinex` and the signed
+POSTs, checking their key, HMAC-SHA384 signature, request path and nonce
+like Bitfinex does. The data is generated from a seed, so every run sees
+the same trades and ledger.
+
+    with MockServer(latency=0.01, failure_rate=0.05) as server:
+        class LocalTrading(Trading):
+            api_url = server.api_url
+        client = LocalTrading(server.key, server.secret)
+
+Several keys can be served, each with its own nonces and, like Bitfinex,
+its own rate limit of the signed requests.
+"""
+import base64
+import bisect
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import random
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYMBOLS = ['btcusd', 'ltcusd', 'ltcbtc', 'ethusd', 'ethbtc']
+CURRENCIES = ['usd', 'btc', 'ltc', 'eth']
+
+TICKER = {'mid': '244.755', 'bid': '244.75', 'ask': '244.76',
+          'last_price': '244.82', 'low': '244.2', 'high': '248.19',
+          'volume': '7842.11542563', 'timestamp': '1444253422.348340958'}
+
+KEY = 'mock-key'
+SECRET = 'mock-secret'
+
+# Timestamp of the first generated record.
+EPOCH = 1444000000
+
+
+def _number(value, digits=8):
+    return '%.*f' % (digits, value)
+
+
+class Series(object):
+    """
+    Records sorted by timestamp, selected by time range like the history
+    endpoints do.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.times = [float(record['timestamp']) for record in records]
+
+    def select(self, since=None, until=None, limit=50, newest_first=True):
+        start = 0 if since is None else bisect.bisect_left(self.times, float(since))
+        end = (len(self.times) if until is None
+               else bisect.bisect_right(self.times, float(until)))
+        if newest_first:
+            return self.records[max(start, end - limit):end][::-1]
+        return self.records[start:min(end, start + limit)]
+
+    def append(self, record):
+        # Timestamps never go back, so the records stay sorted.
+        self.records.append(record)
+        self.times.append(float(record['timestamp']))
+
+
+class Exchange(object):
+    """
+    State of the stand-in exchange: generated market data and the account
+    of the keys, with offers that can be created and cancelled and wallet
+    entries that can be booked with :meth:`book_entry`.
+    """
+
+    def __init__(self, seed=0, history=2000, levels=100):
+        rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.trades = {}
+        for symbol in SYMBOLS:
+            self.trades[symbol] = Series([
+                {'tid': tid, 'timestamp': EPOCH + tid * 7,
+                 'price': _number(240 + rng.random() * 10, 2),
+                 'amount': _number(rng.random() * 5),
+                 'exchange': 'bitfinex', 'type': rng.choice(('buy', 'sell'))}
+                for tid in range(1, history + 1)])
+        self.lends = {}
+        self.lendbooks = {}
+        for currency in CURRENCIES:
+            self.lends[currency] = Series([
+                {'rate': _number(rng.random() * 30, 4),
+                 'amount_lent': _number(1e6 + rng.random() * 1e5),
+                 'amount_used': _number(5e5 + rng.random() * 1e5),
+                 'timestamp': EPOCH + index * 60}
+                for index in range(history)])
+            self.lendbooks[currency] = dict(
+                (side, [{'rate': _number(rate, 4),
+                         'amount': _number(rng.random() * 1000),
+                         'period': rng.choice((2, 7, 30)),
+                         'timestamp': _number(EPOCH, 1),
+                         'frr': rng.choice(('Yes', 'No'))}
+                        for rate in sorted((rng.random() * 30 for _ in range(levels)),
+                                           reverse=side == 'bids')])
+                for side in ('bids', 'asks'))
+        self.book = {
+            'bids': [{'price': _number(244.75 - index * 0.01, 2),
+                      'amount': _number(rng.random() * 10),
+                      'timestamp': _number(EPOCH, 1)} for index in range(levels)],
+            'asks': [{'price': _number(244.76 + index * 0.01, 2),
+                      'amount': _number(rng.random() * 10),
+                      'timestamp': _number(EPOCH, 1)} for index in range(levels)]}
+
+        # The account. Several ledger entries share each timestamp, to
+        # exercise the deduplication at page boundaries.
+        balance = 0.0
+        ledger = []
+        for index in range(history):
+            amount = rng.random() * 2 - 0.9
+            balance += amount
+            ledger.append({'currency': 'USD', 'amount': _number(amount),
+                           'balance': _number(balance),
+                           'description': 'Margin Funding Payment on wallet deposit',
+                           'timestamp': _number(EPOCH + (index // 3) * 300, 1)})
+        self.ledgers = {'USD': Series(ledger)}
+        self.movements = Series([
+            {'id': index + 1, 'currency': 'BTC', 'method': 'BITCOIN',
+             'type': rng.choice(('DEPOSIT', 'WITHDRAWAL')),
+             'amount': _number(rng.random()), 'description': 'txid %d' % index,
+             'status': 'COMPLETED',
+             'timestamp': _number(EPOCH + index * 3600, 1)}
+            for index in range(history // 10)])
+        self.mytrades = Series([
+            {'price': _number(240 + rng.random() * 10, 2),
+             'amount': _number(rng.random()), 'timestamp': _number(EPOCH + index * 60, 1),
+             'exchange': 'bitfinex', 'type': rng.choice(('Buy', 'Sell')),
+             'fee_currency': 'USD', 'fee_amount': _number(-rng.random() * 0.1),
+             'tid': 10000 + index, 'order_id': 5000 + index // 2}
+            for index in range(history)])
+        self.balances = [
+            {'type': wallet, 'currency': currency,
+             'amount': _number(rng.random() * 1000),
+             'available': _number(rng.random() * 100)}
+            for wallet in ('deposit', 'exchange', 'trading')
+            for currency in CURRENCIES]
+        # The USD deposit wallet is where the ledger leaves it.
+        self._balance('deposit', 'USD')['amount'] = _number(balance)
+        self.credits = [
+            {'id': 900 + index, 'currency': 'USD', 'status': 'ACTIVE',
+             'rate': _number(rng.random() * 30, 4), 'period': 30,
+             'amount': _number(rng.random() * 500),
+             'timestamp': _number(EPOCH + index, 1)}
+            for index in range(20)]
+        self.taken_funds = [
+            {'id': 800 + index, 'position_id': 700 + index, 'currency': 'USD',
+             'rate': _number(rng.random() * 30, 4), 'period': 30,
+             'amount': _number(rng.random() * 500),
+             'timestamp': _number(EPOCH + index, 1), 'auto_close': False}
+            for index in range(5)]
+        self.offers = {}
+        self.offer_ids = itertools.count(1000)
+
+    def _balance(self, wallet, currency):
+        for balance in self.balances:
+            if balance['type'] == wallet and balance['currency'] == currency.lower():
+                return balance
+        balance = {'type': wallet, 'currency': currency.lower(),
+                   'amount': _number(0), 'available': _number(0)}
+        self.balances.append(balance)
+        return balance
+
+    def book_entry(self, currency, wallet, amount, description='Adjustment'):
+        """
+        Credit (or debit, if negative) a wallet, with a ledger entry at the
+        current time. Returns the entry.
+        """
+        with self.lock:
+            balance = self._balance(wallet, currency)
+            total = float(balance['amount']) + amount
+            balance['amount'] = _number(total)
+            balance['available'] = _number(float(balance['available']) + amount)
+            series = self.ledgers.setdefault(currency.upper(), Series([]))
+            timestamp = max([time.time()] + series.times[-1:])
+            entry = {'currency': currency.upper(), 'amount': _number(amount),
+                     'balance': _number(total),
+                     'description': '%s on wallet %s' % (description, wallet),
+                     'timestamp': _number(timestamp, 6)}
+            series.append(entry)
+            return entry
+
+    # Public endpoints, called with the rest of the path and the query.
+
+    def get_symbols(self, rest, query):
+        return SYMBOLS
+
+    def get_pubticker(self, rest, query):
+        return TICKER
+
+    def get_stats(self, rest, query):
+        return [{'period': 1, 'volume': '7967.96766158'},
+                {'period': 7, 'volume': '55938.67260266'},
+                {'period': 30, 'volume': '275148.09653645'}]
+
+    def get_book(self, rest, query):
+        return {'bids': self.book['bids'][:int(query.get('limit_bids', 50))],
+                'asks': self.book['asks'][:int(query.get('limit_asks', 50))]}
+
+    def get_lendbook(self, rest, query):
+        book = self.lendbooks[rest]
+        return {'bids': book['bids'][:int(query.get('limit_bids', 50))],
+                'asks': book['asks'][:int(query.get('limit_asks', 50))]}
+
+    def get_trades(self, rest, query):
+        return self.trades[rest].select(query.get('timestamp'), None,
+                                        int(query.get('limit_trades', 50)))
+
+    def get_lends(self, rest, query):
+        limit = query.get('limit_lends', query.get('limit_trades', 50))
+        return self.lends[rest.lower()].select(query.get('timestamp'), None,
+                                               int(limit))
+
+    # Signed endpoints, called with the decoded payload.
+
+    def post_account_infos(self, data):
+        return [{'maker_fees': '0.1', 'taker_fees': '0.2',
+                 'fees': [{'pairs': 'BTC', 'maker_fees': '0.1',
+                           'taker_fees': '0.2'}]}]
+
+    def post_history(self, data):
+        with self.lock:
+            series = self.ledgers.get(data['currency'].upper(), Series([]))
+            if data.get('wallet'):
+                suffix = ' on wallet %s' % data['wallet']
+                series = Series([record for record in series.records
+                                 if record['description'].endswith(suffix)])
+            return series.select(data.get('since'), data.get('until'),
+                                 int(data.get('limit', 500)))
+
+    def post_history_movements(self, data):
+        return self.movements.select(data.get('since'), data.get('until'),
+                                     int(data.get('limit', 500)))
+
+    def post_mytrades(self, data):
+        return self.mytrades.select(data.get('timestamp'), data.get('until'),
+                                    int(data.get('limit_trades', 50)),
+                                    newest_first=not int(data.get('reverse', 0)))
+
+    def post_balances(self, data):
+        return self.balances
+
+    def post_credits(self, data):
+        return self.credits
+
+    def post_taken_funds(self, data):
+        return self.taken_funds
+
+    def post_offers(self, data):
+        with self.lock:
+            return [offer for offer in self.offers.values() if offer['is_live']]
+
+    def post_offer_new(self, data):
+        with self.lock:
+            offer_id = next(self.offer_ids)
+            offer = {'id': offer_id, 'offer_id': offer_id,
+                     'currency': data['currency'], 'rate': data['rate'],
+                     'period': data['period'], 'direction': data['direction'],
+                     'timestamp': _number(time.time(), 6), 'is_live': True,
+                     'is_cancelled': False, 'original_amount': data['amount'],
+                     'remaining_amount': data['amount'], 'executed_amount': '0.0'}
+            self.offers[offer_id] = offer
+            return dict(offer)
+
+    def post_offer_cancel(self, data):
+        with self.lock:
+            offer = self.offers[int(data['offer_id'])]
+            offer['is_live'] = False
+            offer['is_cancelled'] = True
+            return dict(offer)
+
+    def post_offer_status(self, data):
+        with self.lock:
+            return dict(self.offers[int(data['offer_id'])])
+
+
+class Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients may keep the connection alive.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _inject_faults(self):
+        """
+        Sleep for the latency of the server, and answer with an error or
+        stall now and then if asked to. Returns True if an error was sent.
+        """
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.stall_rate and server.random.random() < server.stall_rate:
+            time.sleep(server.stall)
+        if server.failure_rate and server.random.random() < server.failure_rate:
+            self._reply(server.failure_status, {'message': 'Injected failure'})
+            return True
+        return False
+
+    def _split(self):
+        """
+        Path under /v1/ and query parameters of the request.
+        """
+        path, _, query = self.path.partition('?')
+        if not path.startswith('/v1/'):
+            return '', {}
+        params = {}
+        for pair in query.split('&'):
+            if pair:
+                name, _, value = pair.partition('=')
+                params[name] = value
+        return path[len('/v1/'):].rstrip('/'), params
+
+    def do_GET(self):
+        if self._inject_faults():
+            return
+        path, query = self._split()
+        name, _, rest = path.partition('/')
+        handler = getattr(self.server.exchange, 'get_' + name, None)
+        if handler is None:
+            return self._reply(404, {'message': 'Unknown path %s' % self.path})
+        try:
+            body = handler(rest, query)
+        except (KeyError, ValueError) as error:
+            return self._reply(400, {'message': 'Invalid request: %s' % error})
+        self._reply(200, body)
+
+    def do_POST(self):
+        # Read the body, if any, so that the connection can be reused.
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        path = self._split()[0]
+        handler = getattr(self.server.exchange,
+                          'post_' + path.replace('/', '_'), None)
+        # The nonce is checked in the order the requests arrive in, before
+        # the latency which stands in for the network.
+        data, error = None, None
+        if handler is not None:
+            data, error = self.server.authenticate(path, self.headers)
+        if self._inject_faults():
+            return
+        if handler is None:
+            return self._reply(404, {'message': 'Unknown path %s' % self.path})
+        if error is not None:
+            return self._reply(400, {'message': error})
+        if self.server.throttled(self.headers.get('X-BFX-APIKEY')):
+            return self._reply(429, {'error': 'ERR_RATE_LIMIT'})
+        try:
+            body = handler(data)
+        except (KeyError, ValueError) as error:
+            return self._reply(400, {'message': 'Invalid request: %s' % error})
+        self._reply(200, body)
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    # Seconds slept before answering, to stand in for the network.
+    latency = 0.0
+    # Seconds slept when a connection is opened, for the round trips of the
+    # TCP and TLS handshakes.
+    connect_latency = 0.0
+    # Share of the requests answered with failure_status.
+    failure_rate = 0.0
+    failure_status = 503
+    # Share of the requests answered after stall seconds more.
+    stall_rate = 0.0
+    stall = 1.0
+    # Signed requests per second allowed to each key, 0 for no limit, in
+    # bursts of up to key_burst requests.
+    key_rate = 0.0
+    key_burst = 1
+
+    def process_request_thread(self, request, client_address):
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        ThreadingHTTPServer.process_request_thread(self, request, client_address)
+
+    def handle_error(self, request, client_address):
+        # Clients which timed out close the connection before the answer.
+        pass
+
+    def authenticate(self, path, headers):
+        """
+        Check the signed headers of a POST to ``path``. Returns the decoded
+        payload and None, or None and the error message.
+        """
+        key = headers.get('X-BFX-APIKEY')
+        if key not in self.secrets:
+            return None, 'Could not find a key matching the given X-BFX-APIKEY.'
+        payload = headers.get('X-BFX-PAYLOAD', '').encode('ascii')
+        expected = hmac.new(self.secrets[key].encode('utf-8'), payload,
+                            hashlib.sha384).hexdigest()
+        if not hmac.compare_digest(expected, headers.get('X-BFX-SIGNATURE', '')):
+            return None, 'Invalid X-BFX-SIGNATURE.'
+        try:
+            data = json.loads(base64.standard_b64decode(payload).decode('utf-8'))
+            nonce = int(data['nonce'])
+        except (ValueError, KeyError, TypeError):
+            return None, 'Invalid X-BFX-PAYLOAD.'
+        if data.get('request') != '/v1/' + path:
+            return None, 'The request in the payload does not match the path.'
+        with self.nonce_lock:
+            if nonce <= self.last_nonces.get(key, 0):
+                return None, 'Nonce is too small.'
+            self.last_nonces[key] = nonce
+        return data, None
+
+    def throttled(self, key):
+        """
+        True if ``key`` went over its rate limit, counting this request.
+        """
+        if not self.key_rate:
+            return False
+        with self.nonce_lock:
+            now = time.time()
+            tokens, updated = self.budgets.get(key, (self.key_burst, now))
+            tokens = min(self.key_burst, tokens + (now - updated) * self.key_rate)
+            if tokens < 1:
+                self.budgets[key] = (tokens, now)
+                return True
+            self.budgets[key] = (tokens - 1, now)
+            return False
+
+
+def _self_signed(host):
+    """
+    Paths of the files of a new self-signed certificate for ``host`` and of
+    its key.
+    """
+    directory = tempfile.mkdtemp()
+    certfile = os.path.join(directory, 'mockserver.crt')
+    keyfile = os.path.join(directory, 'mockserver.key')
+    subprocess.check_call(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-keyout', keyfile, '-out', certfile, '-days', '1',
+         '-subj', '/CN=%s' % host, '-addext', 'subjectAltName=IP:%s' % host],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+class MockServer(object):
+    """
+    Run the stand-in server in a background thread.
+
+        with MockServer() as server:
+            class LocalPublic(Public):
+                api_url = server.api_url
+
+    The keyword arguments set the faults of :class:`Server`, e.g.
+    ``failure_rate=0.1``. Signed requests must use :attr:`key` and
+    :attr:`secret`, or one of the ``keys`` (key, secret) of
+    :attr:`credentials`.
+
+    With ``tls`` the server answers over HTTPS with a self-signed
+    certificate made by the openssl command, whose file clients must verify
+    with, e.g. ``client.session.verify = server.certfile``.
+    """
+    key = KEY
+    secret = SECRET
+    certfile = None
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, seed=0,
+                 history=2000, keys=1, tls=False, **faults):
+        self.httpd = Server((host, port), Handler)
+        self.httpd.latency = latency
+        self.httpd.random = random.Random(seed)
+        self.httpd.exchange = self.exchange = Exchange(seed, history)
+        self.credentials = [(KEY, SECRET)] + [
+            ('%s-%d' % (KEY, index), '%s-%d' % (SECRET, index))
+            for index in range(2, keys + 1)]
+        self.httpd.secrets = dict(self.credentials)
+        self.httpd.nonce_lock = threading.Lock()
+        self.httpd.last_nonces = {}
+        self.httpd.budgets = {}
+        for name, value in faults.items():
+            setattr(self.httpd, name, value)
+        scheme = 'http'
+        if tls:
+            self.certfile, keyfile = _self_signed(host)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.certfile, keyfile)
+            # The handshake is made by the thread of the connection.
+            self.httpd.socket = context.wrap_socket(
+                self.httpd.socket, server_side=True, do_handshake_on_connect=False)
+            scheme = 'https'
+        self.api_url = '%s://%s:%d/v1/' % ((scheme,) + self.httpd.server_address[:2])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Bitfinex websocket API, version 2, replaying
+recorded channel messages to the streams which subscribe to them.
+
+A recording is a list of {'channel', 'pair', 'message'} dictionaries, as
+written by the ``recorder`` of :class:`bitfinex_stream.Stream` (one json
+per line) or made up by :func:`generate`. Each subscription replays the
+messages of its channel and pair from the start, with its channel id and a
+sequence number, and a checksum after each book update.
+
+    async with WebsocketServer(generate('BTCUSD')) as server:
+        stream = Stream(server.url)
+
+Faults can be injected, once each so that the replays can complete: a
+sequence number skipped after ``gap_after`` messages, a wrong checksum
+as the ``corrupt_after``-th checksum, the connection closed after
+``drop_after`` messages, and a frame which is not json sent before the
+``garbage_after``-th message.
+"""
+import asyncio
+import itertools
+import json
+import random
+import zlib
+
+from aiohttp import WSMsgType, web
+
+SEQ_ALL = 65536
+OB_CHECKSUM = 131072
+
+
+def _text(number):
+    # Numbers are made with few decimals, which Python and JavaScript
+    # write alike.
+    return str(int(number)) if number == int(number) else repr(number)
+
+
+def checksum(bids, asks):
+    """
+    Checksum of the 25 best levels of {price: amount} bids and asks.
+    """
+    bids = sorted(bids.items(), reverse=True)[:25]
+    asks = sorted(asks.items())[:25]
+    parts = []
+    for index in range(25):
+        if index < len(bids):
+            parts += [_text(bids[index][0]), _text(bids[index][1])]
+        if index < len(asks):
+            parts += [_text(asks[index][0]), _text(-asks[index][1])]
+    value = zlib.crc32(':'.join(parts).encode('ascii'))
+    return value - (1 << 32) if value >= 1 << 31 else value
+
+
+def generate(pair='BTCUSD', updates=2000, trades=500, tickers=100, seed=0):
+    """
+    Recording of a book snapshot of 25 levels a side and its updates,
+    trades and tickers of a pair.
+    """
+    rng = random.Random(seed)
+    recording = []
+
+    def add(channel, message):
+        recording.append({'channel': channel, 'pair': pair, 'message': message})
+
+    bids = dict((round(244.0 - index * 0.01, 2), round(rng.uniform(0.1, 10), 4))
+                for index in range(25))
+    asks = dict((round(244.01 + index * 0.01, 2), round(rng.uniform(0.1, 10), 4))
+                for index in range(25))
+    add('book', [[[price, 1, amount] for price, amount in sorted(bids.items(), reverse=True)]
+                 + [[price, 1, -amount] for price, amount in sorted(asks.items())]])
+    for _ in range(updates):
+        side, sign = (bids, 1) if rng.random() < 0.5 else (asks, -1)
+        price = rng.choice(list(side))
+        if rng.random() < 0.2:
+            # Replace the level by another one, outside of the book.
+            del side[price]
+            add('book', [[price, 0, sign]])
+            edge = min(side) if sign > 0 else max(side)
+            price = round(edge - 0.01 * sign, 2)
+        side[price] = round(rng.uniform(0.1, 10), 4)
+        add('book', [[price, rng.randint(1, 5), side[price] * sign]])
+
+    mts = 1444000000000
+    history = []
+    for tid in range(1000000, 1000000 + trades):
+        mts += rng.randint(1, 2000)
+        history.append([tid, mts, round(rng.uniform(-2, 2), 4) or 0.1,
+                        round(rng.uniform(243, 245), 2)])
+    # A snapshot of the 30 first trades, newest first, then the others.
+    add('trades', [history[29::-1]])
+    for trade in history[30:]:
+        add('trades', ['te', trade])
+
+    for _ in range(tickers):
+        bid = round(rng.uniform(243, 244), 2)
+        add('ticker', [[bid, 10.5, round(bid + 0.01, 2), 9.5, 1.2, 0.005,
+                        round(bid + 0.005, 3), 7842.1, 248.19, 240.2]])
+    return recording
+
+
+def final_state(recording, pair='BTCUSD'):
+    """
+    ({price: amount} bids, asks, set of the trade ids, last ticker) once the
+    recording of a pair was replayed.
+    """
+    bids, asks, tids, ticker = {}, {}, set(), None
+    for entry in recording:
+        if entry['pair'] != pair:
+            continue
+        message = entry['message']
+        if entry['channel'] == 'book':
+            levels = message[0]
+            if levels and isinstance(levels[0], list):
+                bids.clear()
+                asks.clear()
+            else:
+                levels = [levels]
+            for price, count, amount in levels:
+                side = bids if amount > 0 else asks
+                if count == 0:
+                    side.pop(price, None)
+                else:
+                    side[price] = abs(amount)
+        elif entry['channel'] == 'trades':
+            if message[0] == 'te':
+                tids.add(message[1][0])
+            elif message[0] != 'tu':
+                tids.update(trade[0] for trade in message[0])
+        elif entry['channel'] == 'ticker':
+            ticker = message[0]
+    return bids, asks, tids, ticker
+
+
+class WebsocketServer(object):
+    """
+    Serve a recording at ``url`` in the running event loop.
+    """
+
+    def __init__(self, recording, host='127.0.0.1', port=0, rate=0,
+                 heartbeat=1.0, gap_after=0, corrupt_after=0, drop_after=0,
+                 garbage_after=0):
+        self.recording = recording
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.heartbeat = heartbeat
+        self.gap_after = gap_after
+        self.corrupt_after = corrupt_after
+        self.drop_after = drop_after
+        self.garbage_after = garbage_after
+        self.sent = 0
+        self.checksums = 0
+        self.url = None
+        self.connections = 0
+        self.subscriptions = 0
+        self._runner = None
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get('/ws/2', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = 'ws://%s:%d/ws/2' % (host, port)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._runner.cleanup()
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        state = {'flags': 0, 'sequence': itertools.count(1)}
+        chan_ids = itertools.count(1)
+        tasks = {}
+        await ws.send_str(json.dumps({'event': 'info', 'version': 2,
+                                      'platform': {'status': 1}}))
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                break
+            event = json.loads(message.data)
+            if event.get('event') == 'conf':
+                state['flags'] = event.get('flags', 0)
+                await ws.send_str(json.dumps({'event': 'conf', 'status': 'OK',
+                                              'flags': state['flags']}))
+            elif event.get('event') == 'subscribe':
+                chan_id = next(chan_ids)
+                pair = event['symbol'][1:]
+                await ws.send_str(json.dumps(dict(
+                    event, event='subscribed', chanId=chan_id, pair=pair)))
+                tasks[chan_id] = asyncio.ensure_future(
+                    self._replay(ws, state, chan_id, event['channel'], pair))
+                self.subscriptions += 1
+            elif event.get('event') == 'unsubscribe':
+                task = tasks.pop(event['chanId'], None)
+                if task is not None:
+                    task.cancel()
+                await ws.send_str(json.dumps({'event': 'unsubscribed', 'status': 'OK',
+                                              'chanId': event['chanId']}))
+        for task in tasks.values():
+            task.cancel()
+        return ws
+
+    async def _send(self, ws, state, message):
+        self.sent += 1
+        if self.sent == self.garbage_after:
+            await ws.send_str('[0, "te", {')
+        if state['flags'] & SEQ_ALL:
+            sequence = next(state['sequence'])
+            if self.sent == self.gap_after:
+                sequence = next(state['sequence'])
+            message = message + [sequence]
+        await ws.send_str(json.dumps(message))
+        if self.sent == self.drop_after:
+            await ws.close()
+
+    async def _replay(self, ws, state, chan_id, channel, pair):
+        try:
+            await self._replay_messages(ws, state, chan_id, channel, pair)
+        except ConnectionError:
+            # The connection was closed.
+            pass
+
+    async def _replay_messages(self, ws, state, chan_id, channel, pair):
+        bids, asks = {}, {}
+        for entry in self.recording:
+            if entry['channel'] != channel or entry['pair'] != pair:
+                continue
+            message = entry['message']
+            await self._send(ws, state, [chan_id] + message)
+            if channel == 'book':
+                levels = message[0]
+                if levels and isinstance(levels[0], list):
+                    bids.clear()
+                    asks.clear()
+                else:
+                    levels = [levels]
+                for price, count, amount in levels:
+                    side = bids if amount > 0 else asks
+                    if count == 0:
+                        side.pop(price, None)
+                    else:
+                        side[price] = abs(amount)
+                if state['flags'] & OB_CHECKSUM:
+                    value = checksum(bids, asks)
+                    self.checksums += 1
+                    if self.checksums == self.corrupt_after:
+                        value += 1
+                    await self._send(ws, state, [chan_id, 'cs', value])
+            await asyncio.sleep(1.0 / self.rate if self.rate else 0)
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            await self._send(ws, state, [chan_id, 'hb'])
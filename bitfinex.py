@@ -7,13 +7,61 @@ import time
 import warnings
 import json
 import base64
+from decimal import Decimal
 import collections
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import random
+import tempfile
+import threading
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows.
+    fcntl = None
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+_NUMBER_START = frozenset('-0123456789')
+
+logger = logging.getLogger('bitfinex')
 
 class BitfinexError(Exception):
     pass
 
+class BitfinexConnectionError(BitfinexError):
+    """
+    The connection to Bitfinex failed or timed out.
+    """
+
+class BitfinexHTTPError(BitfinexError):
+    """
+    Bitfinex answered with an HTTP error status.
+    """
+    def __init__(self, message, status_code=None):
+        super(BitfinexHTTPError, self).__init__(message)
+        self.status_code = status_code
+
+class CircuitOpenError(BitfinexError):
+    """
+    The request was not sent because its endpoint failed too often lately.
+    """
+
+class BitfinexGapError(BitfinexError):
+    """
+    A full page showed that records were left out, see
+    :meth:`Public.iter_trades` with ``strict``.
+    """
+
 """
 class TransRange(object):
 """
@@ -23,6 +71,925 @@ class TransRange(object):
     HOUR = 'hour'
     MINUTE = 'minute'
 """
+class SymbolRegistry(object):
+    """
+    Set of the symbols supported by Bitfinex, requested on first use.
+
+    With a ``cache_file`` the list is also stored on disk and read back by
+    every client, in this process or another one, until it is ``ttl``
+    seconds old. Share one registry between clients to request it only once
+    per process.
+    """
+
+    def __init__(self, cache_file=None, ttl=3600):
+        self.cache_file = cache_file and os.path.expanduser(cache_file)
+        self.ttl = ttl
+        self._symbols = None
+        self._valid = frozenset()
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._symbols is not None
+
+    def load(self, fetch):
+        """
+        Return the list of symbols, reading the cache file or calling
+        ``fetch`` the first time only.
+        """
+        if self._symbols is None:
+            with self._lock:
+                if self._symbols is None and not self.load_cached():
+                    self.update(fetch())
+        return self._symbols
+
+    def load_cached(self):
+        """
+        Load the symbols from the cache file if it is fresh enough. Returns
+        True on success.
+        """
+        if not self.cache_file:
+            return False
+        try:
+            with open(self.cache_file) as f:
+                cached = json.load(f)
+            if time.time() - cached['timestamp'] > self.ttl:
+                return False
+            self._set(cached['symbols'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return False
+        return True
+
+    def update(self, symbols):
+        """
+        Replace the symbols, and write them to the cache file if any.
+        """
+        self._set(symbols)
+        if self.cache_file:
+            self._write_cache(symbols)
+
+    def invalidate(self):
+        """
+        Forget the symbols so that they are loaded again on next use.
+        """
+        self._symbols = None
+        self._valid = frozenset()
+
+    def _set(self, symbols):
+        valid = set()
+        for symbol in symbols:
+            valid.add(symbol.lower())
+            valid.add(symbol.upper())
+        self._valid = frozenset(valid)
+        self._symbols = list(symbols)
+
+    def _write_cache(self, symbols):
+        # Write to a temporary file renamed over the cache, so that other
+        # processes never read a partial file.
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'timestamp': time.time(), 'symbols': list(symbols)}, f)
+            getattr(os, 'replace', os.rename)(path, self.cache_file)
+        except (IOError, OSError):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __contains__(self, symbol):
+        valid = self._valid
+        return symbol in valid or symbol.lower() in valid
+
+class NonceGenerator(object):
+    """
+    Thread-safe generator of strictly increasing nonces, in microseconds
+    since the epoch so that bursts of requests get distinct values.
+
+    With a ``state_file`` the last nonce is stored on disk under an
+    exclusive file lock, so that every process using the file, at the same
+    time or after a restart, gets nonces greater than all the previous ones.
+    Processes sharing one API key must share one state file. Requires a
+    POSIX system.
+
+    Nonces drawn at once by several threads may reach Bitfinex out of
+    order, and the later ones be rejected. So with ``serialize``, the
+    default, the clients of the generator draw the nonce, sign and send
+    their requests one at a time, within :meth:`hold`, across the processes
+    sharing the state file too. Without it the requests are sent at once,
+    for callers that order them themselves.
+    """
+
+    def __init__(self, state_file=None, serialize=True):
+        if state_file and fcntl is None:
+            raise BitfinexError("A nonce state file requires fcntl")
+        self.state_file = state_file and os.path.expanduser(state_file)
+        self.serialize = serialize
+        self.last = 0
+        self._lock = threading.RLock()
+        self._held = 0
+        self._fd = None
+        self._pid = None
+
+    def next(self):
+        """
+        Return a nonce greater than all the nonces returned before.
+        """
+        with self._lock:
+            nonce = max(int(time.time() * 1000000), self.last + 1)
+            if self.state_file:
+                nonce = self._next_shared(nonce)
+            self.last = nonce
+            return nonce
+
+    __call__ = next
+
+    @contextlib.contextmanager
+    def hold(self):
+        """
+        Keep the nonces to the current thread, and process, until the end
+        of the block: a request signed and sent within it reaches Bitfinex
+        before any nonce is drawn again.
+        """
+        with self._lock:
+            if self.state_file and not self._held:
+                fcntl.flock(self._open(), fcntl.LOCK_EX)
+            self._held += 1
+            try:
+                yield
+            finally:
+                self._held -= 1
+                if self.state_file and not self._held:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _open(self):
+        # flock() locks are shared by the processes forked with the file
+        # open, so each process opens the file itself.
+        if self._pid != os.getpid():
+            self._fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def _next_shared(self, nonce):
+        fd = self._open()
+        if not self._held:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            stored = os.read(fd, 32).strip()
+            if stored:
+                nonce = max(nonce, int(stored) + 1)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, str(nonce).encode('ascii'))
+            os.ftruncate(fd, len(str(nonce)))
+        finally:
+            if not self._held:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        return nonce
+
+class Signer(object):
+    """
+    Signs the payloads of the authenticated requests of one API key.
+
+    The secret is encoded and the HMAC-SHA384 keyed once, then copied for
+    each request, and the payload is encoded with a prebuilt json encoder.
+    With ``compact`` (the default) the payload has no whitespace and its
+    fields are in a fixed order, request first and then the others sorted
+    by name. Else it is byte for byte what ``json.dumps`` gives, in the
+    order of the fields given.
+    """
+
+    def __init__(self, key, secret, compact=True):
+        self.key = key
+        self.compact = compact
+        self._mac = hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha384)
+        if compact:
+            self._encode = json.JSONEncoder(separators=(',', ':'),
+                                            sort_keys=True).encode
+        else:
+            self._encode = json.JSONEncoder().encode
+        self._separator = ',' if compact else ', '
+        self._prefixes = {}
+
+    def payload(self, path, data=None):
+        """
+        Base64 encoded json payload of a request to ``path`` with the
+        ``data`` fields, nonce included.
+        """
+        prefix = self._prefixes.get(path)
+        if prefix is None:
+            prefix = self._prefixes[path] = '{"request":%s%s' % (
+                '' if self.compact else ' ', self._encode('/v1/' + path))
+        if data:
+            msg = prefix + self._separator + self._encode(data)[1:]
+        else:
+            msg = prefix + '}'
+        return base64.standard_b64encode(msg.encode('utf-8'))
+
+    def sign(self, path, data=None):
+        """
+        Headers of a request to ``path`` with the ``data`` fields.
+        """
+        payload = self.payload(path, data)
+        mac = self._mac.copy()
+        mac.update(payload)
+        return {'X-BFX-APIKEY': self.key,
+                'X-BFX-PAYLOAD': payload.decode('ascii'),
+                'X-BFX-SIGNATURE': mac.hexdigest()}
+
+    def sign_batch(self, requests):
+        """
+        Headers of each (path, data) of ``requests``, in order.
+        """
+        return [self.sign(path, data) for path, data in requests]
+
+class _Flight(object):
+    """
+    A request in progress, waited for by the threads asking for the same one.
+    """
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class ResponseCache(object):
+    """
+    LRU cache of the json responses of the public endpoints, each kept for
+    the time to live of its endpoint.
+
+    Concurrent calls for the same endpoint and parameters are coalesced:
+    only the first one makes the request and the others wait for its result.
+    Cached responses are shared between callers and must not be modified.
+
+    Input:
+        ttls	[dict]	Optional. Time to live in seconds by endpoint, e.g. {'pubticker/': 2}. Overrides the defaults.
+        maxsize	[int]	Maximum number of responses kept.
+        clock	[callable]	Optional. Returns the current time in seconds.
+    """
+    default_ttls = {'pubticker/': 1.0, 'stats/': 10.0, 'book/': 0.5,
+                    'lendbook/': 0.5, 'trades/': 1.0, 'lends/': 5.0}
+
+    def __init__(self, ttls=None, maxsize=256, clock=None):
+        self.ttls = dict(self.default_ttls)
+        if ttls:
+            self.ttls.update(ttls)
+        self.maxsize = maxsize
+        self.clock = clock or getattr(time, 'monotonic', time.time)
+        self.hits = self.misses = self.coalesced = self.evictions = 0
+        self._data = collections.OrderedDict()
+        self._flights = {}
+        # asyncio futures of the requests in progress, see bitfinex_async.
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def ttl_for(self, url):
+        """
+        Time to live of the responses of an url, 0 if they are not cached.
+        """
+        return self.ttls.get(url[:url.find('/') + 1], 0)
+
+    def key_for(self, url, params=None):
+        return (url, tuple(sorted(params.items()))) if params else (url, ())
+
+    def lookup(self, key):
+        """
+        Return the cached response for a key, or None. Counts a hit.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._data[key]
+                return None
+            # Move the entry to the most recently used end.
+            del self._data[key]
+            self._data[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def store(self, key, value, ttl):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (self.clock() + ttl, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, url, params, fetch):
+        """
+        Return the cached response of ``url`` with ``params``, calling
+        ``fetch`` to request it if it is missing or expired.
+        """
+        ttl = self.ttl_for(url)
+        if not ttl:
+            return fetch()
+        key = self.key_for(url, params)
+        value = self.lookup(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+            self.store(key, flight.value, ttl)
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+        return flight.value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Returns dictionary.
+        hits	[int]	Calls answered from the cache.
+        misses	[int]	Calls which made a request.
+        coalesced	[int]	Calls which waited for the request of another call.
+        evictions	[int]	Responses dropped to stay under maxsize.
+        size	[int]	Number of responses cached.
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'evictions': self.evictions,
+                'size': len(self._data)}
+
+class TokenBucket(object):
+    """
+    Allows ``capacity`` requests at once, refilled at ``rate`` requests per
+    second.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def delay(self, now):
+        """
+        Seconds to wait until a token is available.
+        """
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+class RequestScheduler(object):
+    """
+    Holds the requests back so that each endpoint group stays under its rate
+    limit, sending the waiting requests of a group by order of priority.
+
+    GET requests are grouped by endpoint ('book/', 'pubticker/', ...) and
+    all the authenticated POST requests share the 'auth' group.
+
+    Input:
+        limits	[dict]	Optional. (requests, period in seconds) by group, e.g. {'book/': (60, 60)}. Overrides the defaults.
+        priorities	[dict]	Optional. Priority by endpoint or group, lower is sent first. Overrides the defaults.
+        clock	[callable]	Optional. Returns the current time in seconds.
+        sleep	[callable]	Optional. Called with the seconds to wait for a token. Give it with ``clock`` to simulate time.
+    """
+    default_limits = {'pubticker/': (30, 60), 'stats/': (10, 60),
+                      'book/': (60, 60), 'lendbook/': (45, 60),
+                      'trades/': (45, 60), 'lends/': (60, 60),
+                      'symbols/': (5, 60), 'auth': (90, 60)}
+    default_priorities = {'offer/cancel': 0, 'balances': 0, 'offer/new': 1,
+                          'offer/status': 1, 'offers': 1, 'credits': 1,
+                          'trades/': 9, 'mytrades': 9, 'history': 9,
+                          'history/movements': 9}
+    default_priority = 5
+
+    def __init__(self, limits=None, priorities=None, clock=None, sleep=None):
+        self.clock = clock or getattr(time, 'monotonic', time.time)
+        self.sleep = sleep
+        self.limits = dict(self.default_limits)
+        if limits:
+            self.limits.update(limits)
+        self.priorities = dict(self.default_priorities)
+        if priorities:
+            self.priorities.update(priorities)
+        self._buckets = {}
+        self._queues = collections.defaultdict(list)
+        self._stats = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def group_for(self, url, method='GET'):
+        return 'auth' if method == 'POST' else url[:url.find('/') + 1]
+
+    def priority_for(self, url, method='GET'):
+        if method == 'POST':
+            return self.priorities.get(url, self.default_priority)
+        return self.priorities.get(self.group_for(url), self.default_priority)
+
+    def acquire(self, url, method='GET', priority=None):
+        """
+        Block until the request may be sent. Returns the seconds waited.
+        """
+        group = self.group_for(url, method)
+        limit = self.limits.get(group)
+        if limit is None:
+            return 0.0
+        if priority is None:
+            priority = self.priority_for(url, method)
+
+        with self._cond:
+            start = self.clock()
+            bucket = self._buckets.get(group)
+            if bucket is None:
+                bucket = self._buckets[group] = TokenBucket(
+                    float(limit[0]) / limit[1], limit[0], start)
+            stats = self._stats.get(group)
+            if stats is None:
+                stats = self._stats[group] = {'depth': 0, 'max_depth': 0,
+                                              'requests': 0, 'wait_time': 0.0,
+                                              'max_wait': 0.0}
+            queue = self._queues[group]
+            ticket = (priority, next(self._counter))
+            heapq.heappush(queue, ticket)
+            stats['depth'] = len(queue)
+            stats['max_depth'] = max(stats['max_depth'], len(queue))
+            try:
+                while True:
+                    delay = None
+                    if queue[0] == ticket:
+                        delay = bucket.delay(self.clock())
+                        if delay <= 0:
+                            bucket.consume()
+                            break
+                    self._wait(delay)
+            finally:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                stats['depth'] = len(queue)
+                # Wake up the next request in line.
+                self._cond.notify_all()
+
+            waited = self.clock() - start
+            stats['requests'] += 1
+            stats['wait_time'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+            return waited
+
+    def _wait(self, delay):
+        # Waiting on the condition lets a request of higher priority jump
+        # in; a custom sleep is called without holding the lock.
+        if delay is None or self.sleep is None:
+            self._cond.wait(delay)
+        else:
+            self._cond.release()
+            try:
+                self.sleep(delay)
+            finally:
+                self._cond.acquire()
+
+    def stats(self):
+        """
+        Returns dictionary of dictionaries by group.
+        depth	[int]	Requests currently waiting.
+        max_depth	[int]	Most requests waiting at once.
+        requests	[int]	Requests sent.
+        wait_time	[float]	Total seconds waited by the requests sent.
+        max_wait	[float]	Longest wait in seconds.
+        """
+        with self._cond:
+            return dict((group, dict(stats))
+                        for group, stats in self._stats.items())
+
+class RetryPolicy(object):
+    """
+    Retries of the idempotent GET requests which failed to connect, timed
+    out or got a transient HTTP error, after an exponential backoff with
+    full jitter. POST requests are never retried.
+
+    Input:
+        retries	[int]	Maximum number of retries of a request.
+        backoff	[float]	Maximum delay in seconds before the first retry, doubled at each retry.
+        max_backoff	[float]	Cap of the maximum delay in seconds.
+        statuses	[tuple]	Optional. HTTP statuses to retry. Overrides the defaults.
+        sleep	[callable]	Optional. Called with the seconds to wait.
+        rng	[random.Random]	Optional. Source of the jitter.
+    """
+    default_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, retries=3, backoff=0.1, max_backoff=5.0, statuses=None,
+                 sleep=None, rng=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses or self.default_statuses)
+        self.sleep = sleep or time.sleep
+        self.rng = rng or random.Random()
+
+    def should_retry(self, error):
+        if isinstance(error, BitfinexConnectionError):
+            return True
+        return (isinstance(error, BitfinexHTTPError)
+                and error.status_code in self.statuses)
+
+    def delay(self, attempt):
+        """
+        Seconds to wait before retry number ``attempt``, counted from 0.
+        """
+        return self.rng.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+class CircuitBreaker(object):
+    """
+    Fails the requests of an endpoint fast, with a :class:`CircuitOpenError`,
+    once ``failure_threshold`` of them in a row failed to connect, timed out
+    or got an HTTP 5xx error. After ``reset_timeout`` seconds one request is
+    let through: its success closes the circuit again, its failure keeps it
+    open for another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock or getattr(time, 'monotonic', time.time)
+        # endpoint: [consecutive failures, time opened or None, trial running]
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def before(self, endpoint):
+        """
+        Raise a :class:`CircuitOpenError` if the request must not be sent.
+        """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None or circuit[1] is None:
+                return
+            if circuit[2] or self.clock() - circuit[1] < self.reset_timeout:
+                raise CircuitOpenError("Circuit open for %s after %d failures"
+                                       % (endpoint, circuit[0]))
+            circuit[2] = True
+
+    def success(self, endpoint):
+        with self._lock:
+            self._circuits.pop(endpoint, None)
+
+    def failure(self, endpoint):
+        with self._lock:
+            circuit = self._circuits.setdefault(endpoint, [0, None, False])
+            circuit[0] += 1
+            if circuit[2] or circuit[0] >= self.failure_threshold:
+                if circuit[1] is None:
+                    logger.warning('Circuit opened for %s', endpoint)
+                circuit[1] = self.clock()
+                circuit[2] = False
+
+    def release(self, endpoint):
+        """
+        Let another request through after a trial which was interrupted.
+        """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is not None:
+                circuit[2] = False
+
+    def record(self, endpoint, error):
+        """
+        Record the outcome of a request, ``error`` being None on success.
+        Exceptions raised by the transport, outside :class:`BitfinexError`,
+        count as failures.
+        """
+        if error is None:
+            self.success(endpoint)
+        elif not isinstance(error, Exception):
+            # Interrupted, e.g. KeyboardInterrupt: no outcome to record.
+            self.release(endpoint)
+        elif not isinstance(error, BitfinexError) or isinstance(
+                error, BitfinexConnectionError) or (
+                isinstance(error, BitfinexHTTPError)
+                and (error.status_code or 0) >= 500):
+            self.failure(endpoint)
+        else:
+            # The endpoint answered, only the request was wrong.
+            self.success(endpoint)
+
+    def is_open(self, endpoint):
+        circuit = self._circuits.get(endpoint)
+        return circuit is not None and circuit[1] is not None
+
+class HedgePolicy(object):
+    """
+    Sends a duplicate of a GET request still unanswered after the
+    ``quantile`` of the recent latencies of its endpoint, and returns the
+    first response. Needs ``min_samples`` latencies of an endpoint before
+    hedging its requests.
+    """
+
+    def __init__(self, quantile=0.95, min_samples=20, window=200,
+                 max_workers=8, min_delay=0.0):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.hedged = 0
+        self.executor = ThreadPoolExecutor(max_workers)
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def delay(self, endpoint):
+        """
+        Seconds after which a request of the endpoint is hedged, or None.
+        """
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(self.quantile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def observe(self, endpoint, latency):
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = collections.deque(
+                    maxlen=self.window)
+            latencies.append(latency)
+
+    def call(self, endpoint, attempt):
+        """
+        Call ``attempt``, and again in parallel if it is too slow.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        delay = self.delay(endpoint)
+        start = time.time()
+        if delay is None:
+            result = attempt()
+            self.observe(endpoint, time.time() - start)
+            return result
+
+        pending = set([self.executor.submit(attempt)])
+        done, pending = wait(pending, timeout=delay)
+        if not done:
+            self.hedged += 1
+            pending.add(self.executor.submit(attempt))
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    self.observe(endpoint, time.time() - start)
+                    return future.result()
+                error = future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+def endpoint_label(url, method='GET'):
+    """
+    Endpoint of a request as reported by :class:`Instrumentation`: the
+    path of a POST, the first path segment of a GET ('book/', ...).
+    """
+    if method == 'POST':
+        return url
+    return url[:url.find('/') + 1] or url
+
+class Histogram(object):
+    """
+    Counts of observations by upper bound, plus their sum.
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets) - 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the ``q`` quantile, or None.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.buckets[-1]
+
+class _Probe(object):
+    """
+    Timings of one request, reported to :class:`Instrumentation` by
+    :meth:`finish`.
+    """
+    __slots__ = ('instrumentation', 'endpoint', 'method', 'start', 'server',
+                 'transfer', 'decode', 'bytes', 'status', '_received')
+
+    def __init__(self, instrumentation, endpoint, method):
+        self.instrumentation = instrumentation
+        self.endpoint = endpoint
+        self.method = method
+        self.server = self.transfer = self.decode = None
+        self.bytes = 0
+        self.status = None
+        self.start = instrumentation.clock()
+
+    def received(self, server, size, status):
+        """
+        Mark the response as received: ``server`` is the time until its
+        headers arrived.
+        """
+        self._received = self.instrumentation.clock()
+        self.server = server
+        self.transfer = max(0.0, self._received - self.start - server)
+        self.bytes = size
+        self.status = status
+
+    def finish(self, error=None):
+        now = self.instrumentation.clock()
+        if self.server is not None:
+            self.decode = now - self._received
+        self.instrumentation._record(self, now - self.start, error)
+
+class Instrumentation(object):
+    """
+    Collects the latency, size and outcome of every request of the clients
+    it is given to, by endpoint, and calls hooks before and after each one.
+
+    Latencies are split into phases: 'server', until the response headers
+    arrived (including DNS and connection setup when a new connection is
+    opened), 'transfer' of the body, and 'decode' of the json, plus the
+    'total'.
+
+    Input:
+        buckets	[tuple]	Optional. Upper bounds in seconds of the latency histograms.
+        clock	[callable]	Optional. Returns the current time in seconds.
+    """
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                       5.0, 10.0, float('inf'))
+    phases = ('server', 'transfer', 'decode', 'total')
+
+    def __init__(self, buckets=None, clock=None):
+        self.buckets = tuple(buckets or self.default_buckets)
+        if self.buckets[-1] != float('inf'):
+            self.buckets += (float('inf'),)
+        self.clock = clock or getattr(time, 'perf_counter', time.time)
+        self.before_hooks = []
+        self.after_hooks = []
+        self.histograms = {}
+        self.requests = collections.Counter()
+        self.errors = collections.Counter()
+        self.retries = collections.Counter()
+        self.bytes_received = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add_hook(self, before=None, after=None):
+        """
+        ``before(endpoint, method)`` is called before each request and
+        ``after(endpoint, method, record)`` after it, with a dictionary of
+        its phase durations, 'bytes', 'status' and 'error' (None, or one of
+        'connection', 'http', 'api').
+        """
+        if before is not None:
+            self.before_hooks.append(before)
+        if after is not None:
+            self.after_hooks.append(after)
+
+    def start(self, url, method):
+        endpoint = endpoint_label(url, method)
+        for hook in self.before_hooks:
+            hook(endpoint, method)
+        return _Probe(self, endpoint, method)
+
+    def count_retry(self, url, method='GET'):
+        with self._lock:
+            self.retries[endpoint_label(url, method)] += 1
+
+    def _record(self, probe, total, error):
+        endpoint = probe.endpoint
+        record = {'server': probe.server, 'transfer': probe.transfer,
+                  'decode': probe.decode, 'total': total,
+                  'bytes': probe.bytes, 'status': probe.status, 'error': error}
+        with self._lock:
+            self.requests[endpoint, probe.method] += 1
+            self.bytes_received[endpoint] += probe.bytes
+            if error is not None:
+                self.errors[endpoint, error] += 1
+            for phase in self.phases:
+                if record[phase] is None:
+                    continue
+                histogram = self.histograms.get((endpoint, phase))
+                if histogram is None:
+                    histogram = self.histograms[endpoint, phase] = Histogram(self.buckets)
+                histogram.observe(record[phase])
+        for hook in self.after_hooks:
+            hook(endpoint, probe.method, record)
+
+    def export_text(self, prefix='bitfinex'):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            lines.append('# TYPE %s_request_seconds histogram' % prefix)
+            for (endpoint, phase), histogram in sorted(self.histograms.items()):
+                labels = 'endpoint="%s",phase="%s"' % (endpoint, phase)
+                total = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    total += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_request_seconds_bucket{%s,le="%s"} %d'
+                                 % (prefix, labels, le, total))
+                lines.append('%s_request_seconds_sum{%s} %r'
+                             % (prefix, labels, histogram.sum))
+                lines.append('%s_request_seconds_count{%s} %d'
+                             % (prefix, labels, histogram.count))
+            for name, counter, label_names in (
+                    ('requests_total', self.requests, ('endpoint', 'method')),
+                    ('errors_total', self.errors, ('endpoint', 'kind')),
+                    ('retries_total', self.retries, ('endpoint',)),
+                    ('response_bytes_total', self.bytes_received, ('endpoint',))):
+                lines.append('# TYPE %s_%s counter' % (prefix, name))
+                for key, value in sorted(counter.items()):
+                    key = key if isinstance(key, tuple) else (key,)
+                    labels = ','.join('%s="%s"' % pair for pair in zip(label_names, key))
+                    lines.append('%s_%s{%s} %d' % (prefix, name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+def best_json_loads():
+    """
+    Return the loads function of the fastest json library installed: orjson,
+    ujson, or else the standard json module.
+    """
+    for name in ('orjson', 'ujson'):
+        try:
+            return __import__(name).loads
+        except ImportError:
+            pass
+    return json.loads
+
+def convert_numbers(obj, convert):
+    """
+    Replace in place the numeric strings of the values of the dictionaries
+    in a decoded json response by ``convert(value)``, e.g. float or Decimal.
+    """
+    if isinstance(obj, list):
+        for value in obj:
+            if isinstance(value, (dict, list)):
+                convert_numbers(value, convert)
+        return obj
+    if not isinstance(obj, dict):
+        return obj
+    for key, value in obj.items():
+        if isinstance(value, string_types):
+            # Cheap test on the first character before trying to convert.
+            if value[:1] in _NUMBER_START:
+                try:
+                    obj[key] = convert(value)
+                except (ValueError, ArithmeticError):
+                    pass
+        elif isinstance(value, (dict, list)):
+            convert_numbers(value, convert)
+    return obj
+
 class BaseClient(object):
     """
     A base class for the API Client methods that handles interaction with
@@ -30,19 +997,115 @@ class BaseClient(object):
     """
     api_url = 'https://api.bitfinex.com/v1/'
     exception_on_error = True
-    symbols = []
+    scheduler = None
+    instrumentation = None
+    retry = None
+    circuit_breaker = None
+    hedging = None
+    transport = None
+    signer = None
+    json_loads = staticmethod(json.loads)
+    numbers = 'str'
+    number_types = {'str': None, 'float': float, 'decimal': Decimal}
     #authenticated = False
 
-    def __init__(self, proxydict=None, *args, **kwargs):
+    def __init__(self, proxydict=None, session=None, timeout=(5.0, 30.0),
+                 pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, symbol_registry=None, scheduler=None,
+                 json_loads=None, numbers='str', instrumentation=None,
+                 retry=None, circuit_breaker=None, hedging=None,
+                 transport=None, *args, **kwargs):
+        """
+        Input:
+            proxydict	[dict]	Optional. Proxies passed to requests, e.g. {'https': 'http://host:port'}.
+            session	[requests.Session]	Optional. Session to send the requests with. A pooled one is built if omitted.
+            timeout	[float or tuple]	(connect, read) timeout in seconds of every request. None waits forever.
+            pool_connections	[int]	Number of per-host connection pools to keep.
+            pool_maxsize	[int]	Maximum number of kept-alive connections per host.
+            pool_block	[bool]	Block instead of opening extra connections once a host pool is full.
+            keep_alive	[bool]	Reuse connections between calls. False closes the connection after every call.
+            symbol_registry	[SymbolRegistry]	Optional. Registry of the available symbols, possibly shared with other clients.
+            scheduler	[RequestScheduler]	Optional. Rate limiter the requests wait on, possibly shared with other clients.
+            json_loads	[callable]	Optional. Decodes the json responses, e.g. orjson.loads or best_json_loads().
+            numbers	[string]	Type of the numbers that Bitfinex sends as strings: 'str' (unchanged), 'float' or 'decimal'.
+            instrumentation	[Instrumentation]	Optional. Collects metrics of the requests, possibly shared with other clients.
+            retry	[RetryPolicy]	Optional. Retries of the GET requests which failed.
+            circuit_breaker	[CircuitBreaker]	Optional. Fails fast the requests of the endpoints which keep failing.
+            hedging	[HedgePolicy]	Optional. Duplicates the GET requests slower than usual.
+            transport	[object]	Optional. Sends the requests instead of the session, e.g. bitfinex_capture.RecordTransport or ReplayTransport.
+        """
         self.proxydict = proxydict
-        # Request available symbols
-        self.symbols = self._get("symbols/", return_json=True)
+        self.timeout = timeout
+        if session is None:
+            session = self._build_session(pool_connections, pool_maxsize,
+                                          pool_block, keep_alive)
+        self.session = session
+        # Available symbols are requested on first use.
+        self.symbol_registry = symbol_registry or SymbolRegistry()
+        self.scheduler = scheduler
+        self.instrumentation = instrumentation
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.hedging = hedging
+        self.transport = transport
+        self._set_decoding(json_loads, numbers)
+
+    def _set_decoding(self, json_loads, numbers):
+        if numbers not in self.number_types:
+            raise ValueError("numbers must be one of %s"
+                             % ', '.join(sorted(self.number_types)))
+        if json_loads is not None:
+            self.json_loads = json_loads
+        self.numbers = numbers
+
+    @property
+    def symbols(self):
+        """
+        List of the available symbols.
+        """
+        return self.symbol_registry.load(self._fetch_symbols)
+
+    def _fetch_symbols(self):
+        return self._get("symbols/", return_json=True)
+
+    def _build_session(self, pool_connections, pool_maxsize, pool_block,
+                       keep_alive):
+        """
+        Build a requests session whose connections are pooled and kept alive,
+        so repeated calls skip the TCP and TLS handshakes.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              pool_block=pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def close(self):
+        """
+        Close the pooled connections of the client, and its transport.
+        """
+        self.session.close()
+        if self.transport is not None:
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def _check_symbol(self, symbol):
         """
         Check if symbol is availble. If not raise a BitfinexError
         """
-        if symbol.lower() in self.symbols:
+        registry = self.symbol_registry
+        if not registry.loaded:
+            registry.load(self._fetch_symbols)
+        if symbol in registry:
             return True
         else:
             # Raise an error, the symbol is not avalaible.
@@ -51,30 +1114,59 @@ class BaseClient(object):
 
     def _get(self, *args, **kwargs):
         """
-        Make a GET request.
+        Make a GET request, hedged and retried as set by ``hedging`` and
+        ``retry``.
         """
-        return self._request(requests.get, *args, **kwargs)
+        def attempt():
+            return self._request(self.session.get, *args, **kwargs)
+
+        if self.hedging is not None:
+            endpoint = endpoint_label(args[0])
+            send = lambda: self.hedging.call(endpoint, attempt)
+        else:
+            send = attempt
+        retry = self.retry
+        for count in itertools.count():
+            if self.scheduler is not None:
+                self.scheduler.acquire(args[0], 'GET')
+            try:
+                return send()
+            except BitfinexError as error:
+                if retry is None or count >= retry.retries or not retry.should_retry(error):
+                    raise
+                delay = retry.delay(count)
+                logger.info('Retrying %s in %.3fs: %s', args[0], delay, error)
+                if self.instrumentation is not None:
+                    self.instrumentation.count_retry(args[0])
+                retry.sleep(delay)
 
     def _post(self, *args, **kwargs):
         """
-        Make a POST request.
+        Make a POST request, signed unless it comes with its ``headers``.
         """
-        data = {}
-        #if not self.authenticated:
-        data['X-BFX-APIKEY'] = self.key
-
-        msg={ 'request' : '/v1/' + args[0]}
-        msg.update(self._default_data(*args, **kwargs))
-        if 'data' in kwargs:
-            msg.update(kwargs.pop('data'))
-        data['X-BFX-PAYLOAD'] = base64.standard_b64encode(json.dumps(msg).encode('utf-8'))
+        # Sign once the request may be sent, so that requests overtaken by
+        # one of higher priority do not end up with a smaller nonce.
+        if self.scheduler is not None:
+            self.scheduler.acquire(args[0], 'POST')
+        if 'headers' in kwargs:
+            return self._request(self.session.post, *args, **kwargs)
+        nonces = getattr(self, 'nonce_generator', None)
+        if nonces is None or not nonces.serialize:
+            kwargs['headers'] = self._auth_headers(args[0], kwargs.pop('data', None))
+            return self._request(self.session.post, *args, **kwargs)
+        with nonces.hold():
+            kwargs['headers'] = self._auth_headers(args[0], kwargs.pop('data', None))
+            return self._request(self.session.post, *args, **kwargs)
 
-        signature = hmac.new(
-            self.secret.encode('utf-8'), msg=data['X-BFX-PAYLOAD'],
-            digestmod=hashlib.sha384).hexdigest()
-        data['X-BFX-SIGNATURE'] = signature
-        kwargs['headers'] = data
-        return self._request(requests.post, *args, **kwargs)
+    def _auth_headers(self, path, data=None):
+        """
+        Build the signed headers of an authenticated request: the base64
+        encoded json payload and its HMAC-SHA384 signature.
+        """
+        msg = self._default_data(path)
+        if data:
+            msg.update(data)
+        return self.signer.sign(path, msg)
 
     def _default_data(self, *args, **kwargs):
         """
@@ -84,60 +1176,220 @@ class BaseClient(object):
 
     def _request(self, func, url, *args, **kwargs):
         """
-        Make a generic request, adding in any proxy defined by the instance.
-        Raises a ``requests.HTTPError`` if the response status isn't 200, and
-        raises a :class:`BitfinexError` if the response contains a json encoded
-        error message.
+        Make a generic request through the session of the instance, with
+        any proxy defined for it, unless the circuit breaker of its
+        endpoint is open.
+        Raises a :class:`BitfinexError` if the response status is an HTTP
+        error or if the response contains a json encoded error message.
+        """
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return self._send(func, url, *args, **kwargs)
+        endpoint = endpoint_label(url, func.__name__.upper())
+        breaker.before(endpoint)
+        try:
+            result = self._send(func, url, *args, **kwargs)
+        except BaseException as error:
+            breaker.record(endpoint, error)
+            raise
+        breaker.record(endpoint, None)
+        return result
+
+    def _send(self, func, url, *args, **kwargs):
+        """
+        Send a request and check its response, see :meth:`_request`.
         """
         return_json = kwargs.pop('return_json', False)
-        url = self.api_url + url
-        
+        probe = None
+        if self.instrumentation is not None:
+            probe = self.instrumentation.start(url, func.__name__.upper())
+        path, url = url, self.api_url + url
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        # Per request, as the session proxies give way to the environment.
+        if self.proxydict:
+            kwargs.setdefault('proxies', self.proxydict)
+
         try :
-            response = func(url, *args, **kwargs)
+            if self.transport is None:
+                response = func(url, *args, **kwargs)
+            else:
+                response = self.transport.send(func.__name__.upper(), path,
+                                               func, url, *args, **kwargs)
         except (requests.exceptions.ConnectionError, #requests.exceptions.ConnectTimeout,
                 requests.exceptions.Timeout) as error:
-            json_response = None
-            raise BitfinexError('Connection to Bitfinex failed: %s'%error)
-        
-        if 'proxies' not in kwargs:
-            kwargs['proxies'] = self.proxydict
+            if probe is not None:
+                probe.finish('connection')
+            raise BitfinexConnectionError('Connection to Bitfinex failed: %s'%error)
 
         # Check for error, raising an exception if appropriate.
+        if probe is None:
+            self._raise_for_status(response.status_code, response.reason, url,
+                                   response.content)
+            json_response = self._decode_json(response.content)
+        else:
+            probe.received(response.elapsed.total_seconds(),
+                           len(response.content), response.status_code)
+            json_response = self._checked_json(probe, response.status_code,
+                                               response.reason, url,
+                                               response.content)
+
+        if return_json:
+            if json_response is None:
+                raise BitfinexError(
+                    "Could not decode json for: " + response.text)
+            return json_response
+
+        return response
+
+    def _checked_json(self, probe, status_code, reason, url, content):
+        """
+        Same as :meth:`_raise_for_status` followed by :meth:`_decode_json`,
+        reporting the outcome to the instrumentation probe.
+        """
+        try:
+            self._raise_for_status(status_code, reason, url, content)
+        except BitfinexError:
+            probe.finish('http')
+            raise
         try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            print (e)
-            raise BitfinexError("HTTP Error %s"%e.response.status_code)
+            json_response = self._decode_json(content)
+        except BitfinexError:
+            probe.finish('api')
+            raise
+        probe.finish()
+        return json_response
 
-        if response.status_code == 400:
+    def _raise_for_status(self, status_code, reason, url, content=None):
+        """
+        Raise a :class:`BitfinexError` if the status code is an HTTP error,
+        with the error message of the json ``content`` if any.
+        """
+        if 400 <= status_code < 600:
+            logger.error('%s Error: %s for url: %s', status_code, reason, url)
+            message = "HTTP Error %s"%status_code
             try:
-                json_response = response.json()
-            except ValueError:
-                json_response = None
-            if isinstance(json_response, dict):
-                error = json_response.get('message')
-                if error:
-                    raise BitfinexError(error)
+                error = self.json_loads(content).get('message')
+            except (TypeError, ValueError, AttributeError):
+                error = None
+            if error:
+                message += ": %s"%error
+            raise BitfinexHTTPError(message, status_code)
 
+    def _decode_json(self, content):
+        """
+        Decode the body of a response, once, and convert its numbers as set
+        by ``numbers``. Returns None if it is not json, and raises a
+        :class:`BitfinexError` if it is a json encoded error message.
+        """
         try:
-            json_response = response.json()
+            json_response = self.json_loads(content)
         except ValueError:
-            json_response = None
+            return None
         if isinstance(json_response, dict):
             error = json_response.get('message')
             if error:
                 raise BitfinexError(error)
+        convert = self.number_types[self.numbers]
+        if convert is not None:
+            convert_numbers(json_response, convert)
+        return json_response
 
-        if return_json:
-            if json_response is None:
-                raise BitfinexError(
-                    "Could not decode json for: " + response.text)
-            return json_response
+def _record_key(record):
+    """
+    Identity of a record, to drop the ones repeated across page boundaries.
+    """
+    tid = record.get('tid')
+    if tid is not None:
+        return tid
+    return tuple(sorted(record.items()))
 
-        return response
+def _walk(fetch, since, until, limit, forward):
+    """
+    Yield the records between ``since`` and ``until`` one page at a time.
+    ``fetch(since, until)`` returns a page of at most ``limit`` records,
+    oldest first when ``forward`` or else newest first. Each next page starts
+    at the timestamp the previous one ended with, and the records already
+    yielded at that timestamp are skipped.
+    """
+    edge, seen = None, set()
+    while True:
+        page = fetch(since, until)
+        fresh = False
+        for record in page:
+            key = _record_key(record)
+            if key in seen:
+                continue
+            fresh = True
+            if record['timestamp'] != edge:
+                edge, seen = record['timestamp'], set()
+            seen.add(key)
+            yield record
+        if len(page) < limit or not fresh:
+            return
+        # As a string, which floats and Decimals convert back to exactly.
+        if forward:
+            since = str(edge)
+        else:
+            until = str(edge)
+
+def _iter_windows(walk, since, until, window, workers, forward):
+    """
+    Split ``since`` to ``until`` into windows of ``window`` seconds, walk
+    up to ``workers`` of them at once with ``walk(start, end)`` and yield
+    their records in order, keeping the records of each window within it.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    since, until = float(since), float(until)
+    bounds = []
+    start = since
+    while start < until:
+        end = min(start + window, until)
+        bounds.append((start, end))
+        start = end
+    if not forward:
+        bounds.reverse()
+
+    def fetch(bound):
+        start, end = bound
+        last = end == until
+        return [record for record in walk(start, end)
+                if start <= float(record['timestamp']) < end
+                or (last and float(record['timestamp']) == end)]
+
+    bounds = iter(bounds)
+    with ThreadPoolExecutor(workers) as executor:
+        pending = collections.deque(executor.submit(fetch, bound)
+                                    for bound in itertools.islice(bounds, workers))
+        while pending:
+            records = pending.popleft().result()
+            for bound in itertools.islice(bounds, 1):
+                pending.append(executor.submit(fetch, bound))
+            for record in records:
+                yield record
 
 class Public(BaseClient):
 
+    def __init__(self, *args, **kwargs):
+        """
+        Same arguments as the base class, plus, by keyword only:
+            response_cache	[ResponseCache]	Optional. Cache of the responses, possibly shared with other clients.
+        """
+        response_cache = kwargs.pop('response_cache', None)
+        super(Public, self).__init__(*args, **kwargs)
+        self.response_cache = response_cache
+
+    def _get(self, url, **kwargs):
+        """
+        Make a GET request, answered from the response cache if any.
+        """
+        get = super(Public, self)._get
+        if self.response_cache is None or not kwargs.get('return_json'):
+            return get(url, **kwargs)
+        return self.response_cache.get(url, kwargs.get('params'),
+                                       lambda: get(url, **kwargs))
+
     def ticker(self, symbol ='BTCUSD'):
         """
         Returns dictionary.
@@ -240,39 +1492,80 @@ class Public(BaseClient):
             params.update({'limit_trades': limit_trades})
         return self._get("lends/" + currency, params = params, return_json=True)
 
+    def iter_trades(self, symbol ='BTCUSD', since = None, limit_trades = 1000,
+                    strict = False):
+        """
+        Yield the trades since a timestamp, oldest first, requesting pages
+        until caught up with the latest trade. The endpoint returns the
+        newest trades first, so a full page since a timestamp means that
+        older trades were left out: a warning is issued then, or with
+        ``strict`` a :class:`BitfinexGapError` raised before any trade of the
+        page is yielded. Use a larger ``limit_trades``. Same output as
+        :meth:`trades`.
+        """
+        return self._follow(lambda since: self.trades(symbol, since, limit_trades),
+                            since, limit_trades, strict)
+
+    def iter_lends(self, currency ='USD', since = None, limit_trades = 1000,
+                   strict = False):
+        """
+        Yield the lends since a timestamp, oldest first, like
+        :meth:`iter_trades`. Same output as :meth:`lends`.
+        """
+        return self._follow(lambda since: self.lends(currency, since, limit_trades),
+                            since, limit_trades, strict)
+
+    def _follow(self, fetch, since, limit, strict=False):
+        def fetch_page(since, until):
+            page = fetch(since)
+            if len(page) >= limit and since is not None:
+                message = ("Page of %d records is full, older records "
+                           "were left out" % limit)
+                if strict:
+                    raise BitfinexGapError(message)
+                warnings.warn(message)
+            # Not reversed in place: the page may be a cached response.
+            return page[::-1]
+        return _walk(fetch_page, since, None, limit, forward=True)
+
 class Trading(Public):
 
     def __init__(self, key, secret, *args, **kwargs):
         """
         Stores the username, key, and secret which is used when making POST
-        requests to Bitfinex.
+        requests to Bitfinex. Unless ``check_credentials`` is False, they
+        are checked right away with a call to :meth:`account_infos`.
+        Clients sharing a key must share their ``nonce_generator``, which
+        has them send their signed requests one at a time so that the
+        nonces reach Bitfinex in order, see :class:`NonceGenerator`.
+        The other arguments are those of the base class, and by keyword
+        only:
+            check_credentials	[bool]	Check the credentials right away. True by default.
+            nonce_generator	[NonceGenerator]	Optional. Nonces of the key, possibly shared with other clients.
+            signer	[Signer]	Optional. Signs the payloads, e.g. Signer(key, secret, compact=False). A compact Signer of the key by default.
         """
+        check_credentials = kwargs.pop('check_credentials', True)
+        nonce_generator = kwargs.pop('nonce_generator', None)
+        signer = kwargs.pop('signer', None)
         super(Trading, self).__init__(
             key=key, secret=secret, *args, **kwargs)
         self.key = key
         self.secret = secret
-        self.account_infos()
+        self.signer = signer or Signer(key, secret)
+        self.nonce_generator = nonce_generator or NonceGenerator()
+        if check_credentials:
+            self.account_infos()
         self.authenticated = True
 
-        
-
     def get_nonce(self):
         """
         Get a unique nonce for the bitfinex API.
-        This integer must always be increasing, so use the current unix time.
-        Every time this variable is requested, it automatically increments to
-        allow for more than one API request per second.
-        This isn't a thread-safe function however, so you should only rely on a
-        single thread if you have a high level of concurrent API requests in
-        your application.
-        """
-        nonce = getattr(self, '_nonce', 0)
-        if nonce:
-            nonce += 1
-        # If the unix time is greater though, use that instead (helps low
-        # concurrency multi-threaded apps always call with the largest nonce).
-        self._nonce = max(int(time.time()), nonce)
-        return self._nonce
+        This integer must always be increasing, so use the current unix time
+        in microseconds, incremented when requested more than once per
+        microsecond. Thread-safe, see :class:`NonceGenerator` to share the
+        nonces between processes.
+        """
+        return self.nonce_generator.next()
 
     def _default_data(self, *args, **kwargs):
         """
@@ -282,6 +1575,29 @@ class Trading(Public):
         nonce = self.get_nonce()
         return { 'nonce' : str(nonce)}
 
+    def presign(self, requests):
+        """
+        Sign (path, data) requests ahead of a burst, drawing their nonces
+        now and in order. Returns a list of (path, headers) to send with
+        :meth:`post_presigned` in the same order, before any other signed
+        request of the key, or Bitfinex rejects the nonces as too small.
+        """
+        requests = list(requests)
+        batch = []
+        for path, data in requests:
+            msg = self._default_data(path)
+            if data:
+                msg.update(data)
+            batch.append((path, msg))
+        return [(path, headers) for (path, data), headers
+                in zip(requests, self.signer.sign_batch(batch))]
+
+    def post_presigned(self, path, headers):
+        """
+        Send a request signed by :meth:`presign`. Returns the json response.
+        """
+        return self._post(path, headers=headers, return_json=True)
+
     #def _expect_true(self, response):
         """
         A shortcut that raises a :class:`BitfinexError` if the response didn't
@@ -403,6 +1719,70 @@ class Trading(Public):
 
         return self._post("mytrades", data=data, return_json=True)
 
+    def iter_historical_balance(self, currency, since = None, until = None, limit = 500, wallet = None, window = None, workers = 1):
+        """
+        Yield the balance ledger entries between two timestamps, newest
+        first, requesting as many pages of ``limit`` entries as needed.
+
+        With ``window`` (in seconds) and ``since``, the time range is split
+        into windows of that length, ``workers`` of which are requested at
+        once. Same output as :meth:`historical_balance`.
+        """
+        def fetch(since, until):
+            return self._retry_nonce("history", self.historical_balance,
+                                     currency, since, until, limit, wallet)
+        return self._iter_history(fetch, since, until, limit, window, workers,
+                                  forward=False)
+
+    def iter_historical_movements(self, currency, method = None, since = None, until = None, limit = 500, window = None, workers = 1):
+        """
+        Yield the deposits and withdrawals between two timestamps, newest
+        first, like :meth:`iter_historical_balance`. Same output as
+        :meth:`historical_movements`.
+        """
+        def fetch(since, until):
+            return self._retry_nonce("history/movements",
+                                     self.historical_movements, currency,
+                                     method, since, until, limit)
+        return self._iter_history(fetch, since, until, limit, window, workers,
+                                  forward=False)
+
+    def iter_past_trades(self, symbol, since, until = None, limit_trades = 500, window = None, workers = 1):
+        """
+        Yield your trades between two timestamps, oldest first, like
+        :meth:`iter_historical_balance`. Same output as :meth:`past_trades`.
+        """
+        def fetch(since, until):
+            return self._retry_nonce("mytrades", self.past_trades, symbol,
+                                     since, until, limit_trades, reverse=1)
+        return self._iter_history(fetch, since, until, limit_trades, window,
+                                  workers, forward=True)
+
+    def _iter_history(self, fetch, since, until, limit, window, workers, forward):
+        def walk(since, until):
+            return _walk(fetch, since, until, limit, forward)
+        if window is None or since is None:
+            return walk(since, until)
+        if until is None:
+            until = time.time()
+        return _iter_windows(walk, since, until, window, workers, forward)
+
+    def _retry_nonce(self, path, method, *args, **kwargs):
+        """
+        Call ``method``, again with a new nonce if Bitfinex rejected it:
+        requests sent at once from several threads may reach it out of
+        order.
+        """
+        for attempt in range(5):
+            try:
+                return method(*args, **kwargs)
+            except BitfinexError as error:
+                if 'nonce' not in str(error).lower() or attempt == 4:
+                    raise
+                logger.info('Retrying %s: %s', path, error)
+                if self.instrumentation is not None:
+                    self.instrumentation.count_retry(path, 'POST')
+
 ##################### MARGIN FUNDING #####################
     
     def offer_new(self, currency, amount, rate, period, direction):
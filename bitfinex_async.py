@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio versions of the :mod:`bitfinex` clients, built on aiohttp.
+
+The public methods are the ones of :class:`bitfinex.Public` and
+:class:`bitfinex.Trading`: they build their parameters exactly like the
+blocking clients do and return a coroutine to await instead of the result.
+
+    async with AsyncPublic() as client:
+        tickers = await asyncio.gather(client.ticker('BTCUSD'),
+                                       client.ticker('LTCUSD'))
+
+Requires Python 3.5+ and aiohttp.
+"""
+import asyncio
+import weakref
+
+import aiohttp
+
+from bitfinex import (BaseClient, BitfinexConnectionError, BitfinexError,
+                      NonceGenerator, Public, Signer, SymbolRegistry,
+                      Trading)
+
+# asyncio.Lock of each NonceGenerator, shared by the clients of the key.
+_nonce_locks = weakref.WeakKeyDictionary()
+
+
+class _Blocking(object):
+    """
+    Hides a method of the blocking clients which pages through a history
+    synchronously: reading it raises an AttributeError.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        raise AttributeError(
+            "%s is not available on the asyncio clients, page through the "
+            "history with the method it wraps instead" % self.name)
+
+
+class AsyncBaseClient(BaseClient):
+    """
+    A base class for the asyncio API clients that handles interaction with
+    aiohttp. Signing and error handling are shared with :class:`BaseClient`.
+    """
+
+    def __init__(self, proxydict=None, session=None, timeout=30.0,
+                 max_concurrency=20, pool_maxsize=100, symbol_registry=None,
+                 json_loads=None, numbers='str', instrumentation=None,
+                 *args, **kwargs):
+        """
+        Input:
+            proxydict	[dict]	Optional. Proxies by scheme, e.g. {'https': 'http://host:port'}.
+            session	[aiohttp.ClientSession]	Optional. Session to send the requests with. One is built on first use if omitted.
+            timeout	[float]	Total timeout in seconds of every request. None waits forever.
+            max_concurrency	[int]	Maximum number of requests in flight at once.
+            pool_maxsize	[int]	Maximum number of open connections of the built session.
+            symbol_registry	[SymbolRegistry]	Optional. Registry of the available symbols, possibly shared with other clients.
+            json_loads	[callable]	Optional. Decodes the json responses, e.g. orjson.loads or best_json_loads().
+            numbers	[string]	Type of the numbers that Bitfinex sends as strings: 'str' (unchanged), 'float' or 'decimal'.
+            instrumentation	[Instrumentation]	Optional. Collects metrics of the requests, possibly shared with other clients.
+        """
+        self.proxydict = proxydict or {}
+        self.timeout = timeout
+        self.session = session
+        self._own_session = session is None
+        self.pool_maxsize = pool_maxsize
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.symbol_registry = symbol_registry or SymbolRegistry()
+        self.instrumentation = instrumentation
+        self._set_decoding(json_loads, numbers)
+
+    async def open(self):
+        """
+        Load the available symbols, from the cache file of the registry or
+        else from Bitfinex. Must be awaited before the first call that checks
+        its symbol, ``async with`` does it for you.
+        """
+        registry = self.symbol_registry
+        if not registry.loaded and not registry.load_cached():
+            registry.update(await self._get("symbols/", return_json=True))
+        return self
+
+    def _fetch_symbols(self):
+        raise BitfinexError("Symbols not loaded, await open() first")
+
+    async def close(self):
+        """
+        Close the session of the client if it was built by the client.
+        """
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _build_session(self):
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.pool_maxsize)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    def _get(self, *args, **kwargs):
+        """
+        Make a GET request. Returns a coroutine.
+        """
+        return self._request('GET', *args, **kwargs)
+
+    def _post(self, *args, **kwargs):
+        """
+        Make a POST request. Returns a coroutine.
+        Unless the nonce generator of the key serializes the requests, the
+        payload is signed right away, so nonces follow the call order
+        rather than the order in which the requests get sent.
+        """
+        if 'headers' in kwargs:
+            return self._request('POST', *args, **kwargs)
+        nonces = getattr(self, 'nonce_generator', None)
+        if nonces is None or not nonces.serialize:
+            kwargs['headers'] = self._auth_headers(args[0], kwargs.pop('data', None))
+            return self._request('POST', *args, **kwargs)
+        return self._serialized_post(nonces, *args, **kwargs)
+
+    async def _serialized_post(self, nonces, *args, **kwargs):
+        """
+        Sign and send a POST request while holding the asyncio lock of the
+        nonce generator, so that the signed requests of the key reach
+        Bitfinex in the order of their nonces.
+        """
+        lock = _nonce_locks.get(nonces)
+        if lock is None:
+            lock = _nonce_locks[nonces] = asyncio.Lock()
+        async with lock:
+            kwargs['headers'] = self._auth_headers(args[0], kwargs.pop('data', None))
+            return await self._request('POST', *args, **kwargs)
+
+    async def _request(self, method, url, *args, **kwargs):
+        """
+        Make a generic request, waiting for a free slot if ``max_concurrency``
+        requests are already in flight.
+        Raises a :class:`BitfinexError` if the response status is an HTTP
+        error or if the response contains a json encoded error message.
+        """
+        return_json = kwargs.pop('return_json', False)
+        probe = None
+        if self.instrumentation is not None:
+            probe = self.instrumentation.start(url, method)
+        url = self.api_url + url
+        if self.session is None:
+            self.session = self._build_session()
+        proxy = self.proxydict.get(url.split(':', 1)[0])
+
+        async with self._semaphore:
+            if probe is not None:
+                # Time spent waiting for a slot is not the server's.
+                probe.start = self.instrumentation.clock()
+            try:
+                async with self.session.request(method, url, *args,
+                                                proxy=proxy, **kwargs) as response:
+                    if probe is not None:
+                        server = self.instrumentation.clock() - probe.start
+                    content = await response.read()
+            except (aiohttp.ClientConnectionError,
+                    asyncio.TimeoutError) as error:
+                if probe is not None:
+                    probe.finish('connection')
+                raise BitfinexConnectionError('Connection to Bitfinex failed: %s'%error)
+
+        # Check for error, raising an exception if appropriate.
+        if probe is None:
+            self._raise_for_status(response.status, response.reason, url,
+                                   content)
+            json_response = self._decode_json(content)
+        else:
+            probe.received(server, len(content), response.status)
+            json_response = self._checked_json(probe, response.status,
+                                               response.reason, url, content)
+
+        if return_json:
+            if json_response is None:
+                raise BitfinexError(
+                    "Could not decode json for: " + content.decode('utf-8', 'replace'))
+            return json_response
+
+        return response
+
+
+class AsyncPublic(AsyncBaseClient, Public):
+    """
+    asyncio version of :class:`bitfinex.Public`.
+    """
+    iter_trades = _Blocking('iter_trades')
+    iter_lends = _Blocking('iter_lends')
+
+    def __init__(self, *args, **kwargs):
+        """
+        Same arguments as the base class, plus, by keyword only:
+            response_cache	[ResponseCache]	Optional. Cache of the responses, possibly shared with other clients.
+        """
+        response_cache = kwargs.pop('response_cache', None)
+        super(AsyncPublic, self).__init__(*args, **kwargs)
+        self.response_cache = response_cache
+
+    def _get(self, url, **kwargs):
+        """
+        Make a GET request, answered from the response cache if any.
+        Returns a coroutine.
+        """
+        get = super(AsyncPublic, self)._get
+        if self.response_cache is None or not kwargs.get('return_json'):
+            return get(url, **kwargs)
+        return self._cached_get(url, kwargs.get('params'),
+                                lambda: get(url, **kwargs))
+
+    async def _cached_get(self, url, params, fetch):
+        # Same as ResponseCache.get, with the callers waiting on an asyncio
+        # future rather than a threading event.
+        cache = self.response_cache
+        ttl = cache.ttl_for(url)
+        if not ttl:
+            return await fetch()
+        key = cache.key_for(url, params)
+        value = cache.lookup(key)
+        if value is not None:
+            return value
+
+        future = cache._futures.get(key)
+        if future is not None:
+            cache.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = cache._futures[key] = asyncio.get_event_loop().create_future()
+        # Retrieve the exception so that it is not reported when nobody waited.
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        cache.misses += 1
+        try:
+            value = await fetch()
+            cache.store(key, value, ttl)
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            del cache._futures[key]
+            if not future.done():
+                future.cancel()
+        return value
+
+
+class AsyncTrading(AsyncPublic, Trading):
+    """
+    asyncio version of :class:`bitfinex.Trading`.
+    """
+
+    def __init__(self, key, secret, *args, **kwargs):
+        """
+        Stores the key and secret which are used when making POST requests to
+        Bitfinex. Unless ``check_credentials`` is False, they are checked by
+        :meth:`open` with a call to :meth:`account_infos`.
+        Clients sharing a key must share their ``nonce_generator``.
+        The other arguments are those of the base class, and by keyword
+        only:
+            check_credentials	[bool]	Check the credentials in open(). True by default.
+            nonce_generator	[NonceGenerator]	Optional. Nonces of the key, possibly shared with other clients.
+            signer	[Signer]	Optional. Signs the payloads, e.g. Signer(key, secret, compact=False). A compact Signer of the key by default.
+        """
+        check_credentials = kwargs.pop('check_credentials', True)
+        nonce_generator = kwargs.pop('nonce_generator', None)
+        signer = kwargs.pop('signer', None)
+        super(AsyncTrading, self).__init__(*args, **kwargs)
+        self.key = key
+        self.secret = secret
+        self.signer = signer or Signer(key, secret)
+        self.nonce_generator = nonce_generator or NonceGenerator()
+        self.check_credentials = check_credentials
+        self.authenticated = True
+
+    async def open(self):
+        """
+        Load the available symbols and check the credentials.
+        """
+        await super(AsyncTrading, self).open()
+        if self.check_credentials:
+            await self.account_infos()
+        return self
+
+    iter_historical_balance = _Blocking('iter_historical_balance')
+    iter_historical_movements = _Blocking('iter_historical_movements')
+    iter_past_trades = _Blocking('iter_past_trades')
+
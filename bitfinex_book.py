@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Compact order books built from the responses of :meth:`Public.orderbook`
+and :meth:`Public.fundingbook`.
+
+Prices and amounts are parsed once into contiguous ``array.array('d')``
+columns, bids sorted from the best (highest) price down and asks from the
+best (lowest) price up. With NumPy installed, :meth:`OrderBook.as_numpy`
+returns views on them without copying.
+
+    book = OrderBook.from_response(client.orderbook('BTCUSD'))
+    book.best_bid(), book.vwap(10, 'buy')
+"""
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BIDS, ASKS = 'bids', 'asks'
+
+
+def _find(prices, price, descending):
+    """
+    Index of the first level of ``prices`` at or beyond ``price``.
+    """
+    lo, hi = 0, len(prices)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if (prices[mid] > price) if descending else (prices[mid] < price):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _totals(prices, amounts):
+    """
+    Dictionary of the total amount at each price.
+    """
+    totals = {}
+    for price, amount in zip(prices, amounts):
+        totals[price] = totals.get(price, 0.0) + amount
+    return totals
+
+
+class OrderBook(object):
+    """
+    Bids and asks of an order book as price and amount columns.
+    """
+    price_key = 'price'
+
+    def __init__(self, bid_prices, bid_amounts, ask_prices, ask_amounts,
+                 timestamp=None):
+        self.bid_prices = bid_prices
+        self.bid_amounts = bid_amounts
+        self.ask_prices = ask_prices
+        self.ask_amounts = ask_amounts
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        Build the book from the dictionary returned by the API.
+        """
+        timestamp = None
+        columns = []
+        for side, descending in ((BIDS, True), (ASKS, False)):
+            levels = []
+            for level in response.get(side) or ():
+                levels.append(cls._parse_level(level))
+                stamp = float(level.get('timestamp') or 0)
+                if timestamp is None or stamp > timestamp:
+                    timestamp = stamp
+            levels.sort(key=lambda level: level[0], reverse=descending)
+            columns.append(levels)
+        return cls._from_levels(columns[0], columns[1], timestamp)
+
+    @classmethod
+    def _parse_level(cls, level):
+        return (float(level[cls.price_key]), float(level['amount']))
+
+    @classmethod
+    def _from_levels(cls, bids, asks, timestamp):
+        return cls(array('d', [level[0] for level in bids]),
+                   array('d', [level[1] for level in bids]),
+                   array('d', [level[0] for level in asks]),
+                   array('d', [level[1] for level in asks]),
+                   timestamp)
+
+    def _side(self, side):
+        if side == BIDS:
+            return self.bid_prices, self.bid_amounts, True
+        if side == ASKS:
+            return self.ask_prices, self.ask_amounts, False
+        raise ValueError("side must be 'bids' or 'asks'")
+
+    def __len__(self):
+        return len(self.bid_prices) + len(self.ask_prices)
+
+    def best_bid(self):
+        """
+        (price, amount) of the best bid, or None.
+        """
+        if self.bid_prices:
+            return self.bid_prices[0], self.bid_amounts[0]
+
+    def best_ask(self):
+        """
+        (price, amount) of the best ask, or None.
+        """
+        if self.ask_prices:
+            return self.ask_prices[0], self.ask_amounts[0]
+
+    def spread(self):
+        if self.bid_prices and self.ask_prices:
+            return self.ask_prices[0] - self.bid_prices[0]
+
+    def mid(self):
+        if self.bid_prices and self.ask_prices:
+            return (self.ask_prices[0] + self.bid_prices[0]) / 2
+
+    def depth_at(self, price, side):
+        """
+        Amount offered at exactly ``price`` on ``side``, summed over the
+        levels at that price, 0 if there are none.
+        """
+        prices, amounts, descending = self._side(side)
+        index = _find(prices, price, descending)
+        total = 0.0
+        while index < len(prices) and prices[index] == price:
+            total += amounts[index]
+            index += 1
+        return total
+
+    def cumulative_depth(self, side, levels=None):
+        """
+        Running total of the amounts of ``side`` from the best level, as an
+        array of at most ``levels`` values.
+        """
+        amounts = self._side(side)[1]
+        if levels is not None:
+            amounts = amounts[:levels]
+        total = 0.0
+        depth = array('d', amounts)
+        for index, amount in enumerate(amounts):
+            total += amount
+            depth[index] = total
+        return depth
+
+    def depth_to(self, price, side):
+        """
+        Total amount of ``side`` from the best level down to ``price``
+        included.
+        """
+        prices, amounts, descending = self._side(side)
+        index = _find(prices, price, descending)
+        if index < len(prices) and prices[index] == price:
+            index += 1
+        return sum(amounts[:index])
+
+    def vwap(self, size, action='buy'):
+        """
+        Volume weighted average price to buy (against the asks) or sell
+        (against the bids) ``size``. None if the book is not deep enough.
+        """
+        if not size > 0:
+            raise ValueError("size must be positive")
+        side = ASKS if action == 'buy' else BIDS
+        prices, amounts = self._side(side)[:2]
+        remaining = size
+        cost = 0.0
+        for price, amount in zip(prices, amounts):
+            if amount >= remaining:
+                return (cost + remaining * price) / size
+            cost += amount * price
+            remaining -= amount
+        return None
+
+    def diff(self, previous):
+        """
+        Levels which changed since the ``previous`` book, as a dictionary
+        with 'bids' and 'asks' lists of (price, amount), best first. Levels
+        which disappeared have an amount of 0. The amounts at one price, as
+        the several periods of a funding book at one rate, are summed.
+        """
+        changes = {}
+        for side in (BIDS, ASKS):
+            prices, amounts, descending = self._side(side)
+            new = _totals(prices, amounts)
+            old = _totals(*previous._side(side)[:2])
+            changed = []
+            for price, amount in new.items():
+                if old.pop(price, None) != amount:
+                    changed.append((price, amount))
+            changed.extend((price, 0.0) for price in old)
+            changed.sort(key=lambda level: level[0], reverse=descending)
+            changes[side] = changed
+        return changes
+
+    def as_numpy(self):
+        """
+        Dictionary of NumPy views on the columns, sharing their memory.
+        Requires NumPy.
+        """
+        if numpy is None:
+            raise ImportError("as_numpy() requires numpy")
+        dtypes = {'d': numpy.float64, 'i': numpy.intc, 'b': numpy.int8}
+        return dict((name, numpy.frombuffer(column, dtype=dtypes[column.typecode]))
+                    for name, column in self._columns())
+
+    def _columns(self):
+        return (('bid_prices', self.bid_prices),
+                ('bid_amounts', self.bid_amounts),
+                ('ask_prices', self.ask_prices),
+                ('ask_amounts', self.ask_amounts))
+
+
+class FundingBook(OrderBook):
+    """
+    Funding book, priced by rate. Bids are the funding requested, best
+    (highest) rate first, and asks the funding offered, best (lowest) rate
+    first. Also keeps the periods and whether levels are at the Flash Return
+    Rate.
+    """
+    price_key = 'rate'
+
+    def __init__(self, bid_prices, bid_amounts, ask_prices, ask_amounts,
+                 timestamp=None, bid_periods=None, ask_periods=None,
+                 bid_frr=None, ask_frr=None):
+        super(FundingBook, self).__init__(bid_prices, bid_amounts,
+                                          ask_prices, ask_amounts, timestamp)
+        self.bid_periods = bid_periods if bid_periods is not None else array('i')
+        self.ask_periods = ask_periods if ask_periods is not None else array('i')
+        self.bid_frr = bid_frr if bid_frr is not None else array('b')
+        self.ask_frr = ask_frr if ask_frr is not None else array('b')
+
+    @property
+    def bid_rates(self):
+        return self.bid_prices
+
+    @property
+    def ask_rates(self):
+        return self.ask_prices
+
+    @classmethod
+    def _parse_level(cls, level):
+        return (float(level['rate']), float(level['amount']),
+                int(level.get('period') or 0),
+                str(level.get('frr', '')).lower() == 'yes')
+
+    @classmethod
+    def _from_levels(cls, bids, asks, timestamp):
+        book = super(FundingBook, cls)._from_levels(bids, asks, timestamp)
+        book.bid_periods = array('i', [level[2] for level in bids])
+        book.ask_periods = array('i', [level[2] for level in asks])
+        book.bid_frr = array('b', [level[3] for level in bids])
+        book.ask_frr = array('b', [level[3] for level in asks])
+        return book
+
+    def _columns(self):
+        return super(FundingBook, self)._columns() + (
+            ('bid_periods', self.bid_periods), ('ask_periods', self.ask_periods),
+            ('bid_frr', self.bid_frr), ('ask_frr', self.ask_frr))
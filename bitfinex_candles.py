@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+OHLCV candles computed with NumPy from trades, as returned by
+:meth:`Public.trades` or read from a :class:`bitfinex_store.TradeStore`.
+
+    bars = candles(client.trades('BTCUSD'), 60)
+    bars.close, bars.vwap, bars.buy_volume
+
+Trades are deduplicated by tid and ordered by (timestamp, tid), so the
+input may repeat trades or come in any order. :class:`CandleBuilder`
+keeps candles up to date as new trades arrive.
+
+Requires NumPy.
+"""
+import numpy
+
+CANDLE = numpy.dtype([('time', '<f8'), ('open', '<f8'), ('high', '<f8'),
+                      ('low', '<f8'), ('close', '<f8'), ('volume', '<f8'),
+                      ('vwap', '<f8'), ('buy_volume', '<f8'),
+                      ('sell_volume', '<f8'), ('trades', '<i8')])
+
+SIDES = {'buy': 1, 'sell': -1}
+
+
+def trade_columns(trades):
+    """
+    tid, timestamp, price, amount and side (1 buy, -1 sell, 0 undetermined)
+    arrays of the trades: a list of dictionaries returned by the API, or an
+    array with these fields (a ``type`` field holding the side).
+    """
+    if isinstance(trades, numpy.ndarray):
+        side = trades['side'] if 'side' in trades.dtype.names else trades['type']
+        return (trades['tid'].astype('<i8'), trades['timestamp'].astype('<f8'),
+                trades['price'].astype('<f8'), trades['amount'].astype('<f8'),
+                side.astype('i1'))
+    count = len(trades)
+    return (numpy.fromiter((int(t['tid']) for t in trades), '<i8', count),
+            numpy.fromiter((float(t['timestamp']) for t in trades), '<f8', count),
+            numpy.fromiter((float(t['price']) for t in trades), '<f8', count),
+            numpy.fromiter((float(t['amount']) for t in trades), '<f8', count),
+            numpy.fromiter((SIDES.get(str(t.get('type', '')).lower(), 0)
+                            for t in trades), 'i1', count))
+
+
+BAR_FIELDS = ('time', 'high', 'low', 'volume', 'notional', 'buy_volume',
+              'sell_volume', 'trades', 'first_time', 'first_tid',
+              'first_price', 'last_time', 'last_tid', 'last_price')
+
+
+def _aggregate(columns, interval):
+    """
+    Sums and extremes of the trades by bar, as a dictionary of arrays, with
+    the (timestamp, tid) of the first and last trade of each bar so that
+    bars computed separately can be merged.
+    """
+    tid, timestamp, price, amount, side = columns
+    if not len(tid):
+        return dict((name, numpy.zeros(0)) for name in BAR_FIELDS)
+    # Drop repeated tids, then sort by time and tid.
+    tid, index = numpy.unique(tid, return_index=True)
+    timestamp, price, amount, side = (timestamp[index], price[index],
+                                      amount[index], side[index])
+    order = numpy.lexsort((tid, timestamp))
+    tid, timestamp, price, amount, side = (tid[order], timestamp[order],
+                                           price[order], amount[order],
+                                           side[order])
+    amount = numpy.abs(amount)
+
+    bar = numpy.floor(timestamp / interval) * interval
+    starts = numpy.flatnonzero(numpy.r_[True, bar[1:] != bar[:-1]])
+    ends = numpy.r_[starts[1:], len(bar)] - 1
+    return {
+        'time': bar[starts],
+        'high': numpy.maximum.reduceat(price, starts),
+        'low': numpy.minimum.reduceat(price, starts),
+        'volume': numpy.add.reduceat(amount, starts),
+        'notional': numpy.add.reduceat(price * amount, starts),
+        'buy_volume': numpy.add.reduceat(amount * (side > 0), starts),
+        'sell_volume': numpy.add.reduceat(amount * (side < 0), starts),
+        'trades': ends - starts + 1,
+        'first_time': timestamp[starts], 'first_tid': tid[starts],
+        'first_price': price[starts],
+        'last_time': timestamp[ends], 'last_tid': tid[ends],
+        'last_price': price[ends],
+    }
+
+
+def _to_candles(bars):
+    result = numpy.zeros(len(bars['time']), dtype=CANDLE).view(numpy.recarray)
+    for name in ('time', 'high', 'low', 'volume', 'buy_volume',
+                 'sell_volume', 'trades'):
+        result[name] = bars[name]
+    result['open'] = bars['first_price']
+    result['close'] = bars['last_price']
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        result['vwap'] = bars['notional'] / bars['volume']
+    return result
+
+
+def _stack(bars):
+    """
+    Dictionary of arrays of a list of bar dictionaries.
+    """
+    return dict((name, numpy.array([bar[name] for bar in bars], dtype='<f8'))
+                for name in BAR_FIELDS)
+
+
+def candles(trades, interval):
+    """
+    Candles of ``interval`` seconds of the trades, as a record array with
+    the fields of :data:`CANDLE`, time being the start of the bar. Bars
+    without trades are left out.
+    """
+    return _to_candles(_aggregate(trade_columns(trades), interval))
+
+
+class CandleBuilder(object):
+    """
+    Candles updated with each new batch of trades.
+
+    Each batch is aggregated at once and merged into the bars it touches,
+    usually only the open one. Trades may arrive late or more than once: a
+    tid is only counted once, and a late trade updates its bar. The tids
+    are remembered for the bars until they are removed with
+    :meth:`pop_closed`, after which older trades are ignored.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.popped_until = None
+        self._bars = {}
+        self._tids = {}
+
+    def update(self, trades):
+        """
+        Merge a batch of trades. Returns the start times of the bars which
+        changed.
+        """
+        columns = trade_columns(trades)
+        tid, timestamp = columns[0], columns[1]
+        bar_times = (numpy.floor(timestamp / self.interval) * self.interval).tolist()
+        # A repeated trade has the same timestamp, so it falls in the same bar.
+        keep = numpy.fromiter((t not in self._tids.get(b, ())
+                               for t, b in zip(tid.tolist(), bar_times)),
+                              bool, len(tid))
+        if self.popped_until is not None:
+            keep &= timestamp >= self.popped_until
+        columns = [column[keep] for column in columns]
+        for t, b in zip(columns[0].tolist(), numpy.compress(keep, bar_times).tolist()):
+            self._tids.setdefault(b, set()).add(t)
+
+        bars = _aggregate(columns, self.interval)
+        changed = []
+        for row in zip(*[bars[name].tolist() for name in BAR_FIELDS]):
+            bar = dict(zip(BAR_FIELDS, row))
+            current = self._bars.get(bar['time'])
+            if current is None:
+                self._bars[bar['time']] = bar
+            else:
+                self._merge(current, bar)
+            changed.append(bar['time'])
+        return changed
+
+    def _merge(self, current, bar):
+        current['high'] = max(current['high'], bar['high'])
+        current['low'] = min(current['low'], bar['low'])
+        for name in ('volume', 'notional', 'buy_volume', 'sell_volume', 'trades'):
+            current[name] += bar[name]
+        if (bar['first_time'], bar['first_tid']) < (current['first_time'], current['first_tid']):
+            for name in ('first_time', 'first_tid', 'first_price'):
+                current[name] = bar[name]
+        if (bar['last_time'], bar['last_tid']) > (current['last_time'], current['last_tid']):
+            for name in ('last_time', 'last_tid', 'last_price'):
+                current[name] = bar[name]
+
+    def candles(self):
+        """
+        The bars kept, as a record array like :func:`candles`.
+        """
+        return _to_candles(_stack([self._bars[t] for t in sorted(self._bars)]))
+
+    def pop_closed(self, now):
+        """
+        Remove and return the bars ended at ``now``, forgetting their tids.
+        """
+        start = numpy.floor(now / self.interval) * self.interval
+        times = sorted(t for t in self._bars if t < start)
+        if times:
+            self.popped_until = times[-1] + self.interval
+        for t in times:
+            self._tids.pop(t, None)
+        return _to_candles(_stack([self._bars.pop(t) for t in times]))
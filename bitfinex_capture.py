@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Record the requests of a client and their responses to a capture file, and
+replay them later without any network, e.g. for backtests.
+
+    client = Public(transport=RecordTransport('session.bfxcap'))
+    ...
+    client.close()          # writes the index of the capture
+
+    clock = VirtualClock()
+    client = Public(transport=ReplayTransport('session.bfxcap', clock=clock))
+
+Requests are matched on their method, endpoint and parameters, ignoring
+the nonce and signature of the authenticated ones. Without a clock, the
+responses recorded for a request are replayed in order. With a
+:class:`VirtualClock`, which starts at the time of the first record, a
+request gets the last response recorded at or before the time of the
+clock, so that a backtest decides how fast time goes by sleeping on the
+clock. A clock can also be given to a :class:`bitfinex.RequestScheduler`
+and a :class:`bitfinex.ResponseCache`.
+
+A capture file is a sequence of zlib compressed records, each one the
+headers of the request and response in json followed by the body of the
+response, and an index of the records by request at the end. Records are
+read from the file on demand, so large captures are not loaded in memory.
+A capture left without index, by a recording process which was killed, is
+indexed again by reading it through.
+"""
+import base64
+import bisect
+import datetime
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from bitfinex import BitfinexError
+
+MAGIC = b'BFXCAP1\n'
+END = b'BFXEND1\n'
+LENGTH = struct.Struct('<I')
+FOOTER = struct.Struct('<Q8s')
+
+
+def request_key(method, path, params=None, headers=None):
+    """
+    Key of a request in a capture: its method, endpoint and parameters,
+    those of the signed payload included, without the nonce.
+    """
+    params = dict((str(name), str(value)) for name, value in (params or {}).items())
+    payload = (headers or {}).get('X-BFX-PAYLOAD')
+    if payload:
+        data = json.loads(base64.standard_b64decode(payload).decode('utf-8'))
+        data.pop('nonce', None)
+        data.pop('request', None)
+        params.update((str(name), str(value)) for name, value in data.items())
+    return json.dumps([method, path.strip('/'), sorted(params.items())])
+
+
+class CapturedResponse(object):
+    """
+    Response read from a capture, with the attributes of a
+    ``requests.Response`` that the clients use.
+    """
+
+    def __init__(self, url, status_code, reason, content, elapsed, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.content = content
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class VirtualClock(object):
+    """
+    Clock whose time only moves when told to. :meth:`sleep` returns at once
+    after moving the time forward.
+    """
+
+    def __init__(self, start=None):
+        self.now = start
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    __call__ = time
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.now += max(seconds, 0)
+
+    def advance_to(self, timestamp):
+        with self._lock:
+            self.now = max(self.now, timestamp)
+
+
+class CaptureFile(object):
+    """
+    A capture file opened for appending records (``mode='a'``) or reading
+    them (``mode='r'``). ``index`` maps the keys of the requests to the
+    sorted lists of (time, offset) of their records.
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = os.path.expanduser(path)
+        self.mode = mode
+        self.index = {}
+        self._lock = threading.Lock()
+        if mode == 'a' and not os.path.exists(self.path):
+            self.file = open(self.path, 'w+b')
+            self.file.write(MAGIC)
+            self.end = len(MAGIC)
+            return
+        self.file = open(self.path, 'r+b' if mode == 'a' else 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise BitfinexError("%s is not a capture file" % self.path)
+        if not self._load_index():
+            self._scan()
+        if mode == 'a':
+            # Records are appended over the index, written again on close.
+            self.file.truncate(self.end)
+
+    def _load_index(self):
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+        if size < len(MAGIC) + FOOTER.size:
+            return False
+        self.file.seek(size - FOOTER.size)
+        offset, end = FOOTER.unpack(self.file.read(FOOTER.size))
+        if end != END:
+            return False
+        self.file.seek(offset)
+        length, = LENGTH.unpack(self.file.read(LENGTH.size))
+        index = json.loads(zlib.decompress(self.file.read(length)).decode('utf-8'))
+        self.index = dict((key, [tuple(entry) for entry in entries])
+                          for key, entries in index.items())
+        self.end = offset
+        return True
+
+    def _scan(self):
+        """
+        Index the records by reading the file through, up to the last
+        complete one.
+        """
+        offset = len(MAGIC)
+        self.file.seek(offset)
+        while True:
+            prefix = self.file.read(LENGTH.size)
+            if len(prefix) < LENGTH.size:
+                break
+            length, = LENGTH.unpack(prefix)
+            blob = self.file.read(length)
+            if len(blob) < length:
+                break
+            try:
+                header = self._decode(blob)[0]
+            except (zlib.error, ValueError):
+                break
+            self._add(header['key'], header['time'], offset)
+            offset += LENGTH.size + length
+        self.end = offset
+
+    def _add(self, key, timestamp, offset):
+        entries = self.index.setdefault(key, [])
+        if entries and timestamp < entries[-1][0]:
+            bisect.insort(entries, (timestamp, offset))
+        else:
+            entries.append((timestamp, offset))
+
+    @staticmethod
+    def _decode(blob):
+        data = zlib.decompress(blob)
+        length, = LENGTH.unpack_from(data)
+        header = json.loads(data[LENGTH.size:LENGTH.size + length].decode('utf-8'))
+        return header, data[LENGTH.size + length:]
+
+    def append(self, header, content):
+        """
+        Append a record of the response ``content`` with the ``header``
+        dictionary, which holds its 'key' and 'time'.
+        """
+        encoded = json.dumps(header).encode('utf-8')
+        blob = zlib.compress(LENGTH.pack(len(encoded)) + encoded + content)
+        with self._lock:
+            self.file.seek(self.end)
+            self.file.write(LENGTH.pack(len(blob)) + blob)
+            self._add(header['key'], header['time'], self.end)
+            self.end += LENGTH.size + len(blob)
+
+    def read(self, offset):
+        """
+        (header, content) of the record at ``offset``.
+        """
+        with self._lock:
+            self.file.seek(offset)
+            length, = LENGTH.unpack(self.file.read(LENGTH.size))
+            blob = self.file.read(length)
+        return self._decode(blob)
+
+    def __iter__(self):
+        """
+        (header, content) of every record, in the order of the file.
+        """
+        offsets = sorted(offset for entries in self.index.values()
+                         for timestamp, offset in entries)
+        for offset in offsets:
+            yield self.read(offset)
+
+    @property
+    def start_time(self):
+        times = [entries[0][0] for entries in self.index.values() if entries]
+        return min(times) if times else None
+
+    def close(self):
+        with self._lock:
+            if self.file.closed:
+                return
+            if self.mode == 'a':
+                self.file.seek(self.end)
+                index = zlib.compress(json.dumps(self.index).encode('utf-8'))
+                self.file.write(LENGTH.pack(len(index)) + index)
+                self.file.write(FOOTER.pack(self.end, END))
+                self.file.truncate()
+            self.file.close()
+
+
+class RecordTransport(object):
+    """
+    Send the requests to Bitfinex and record them with their responses in a
+    capture file, appended to if it exists. Can be shared by several
+    clients; :meth:`close` it, or close a client using it, to write the
+    index.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.capture = CaptureFile(path, 'a')
+        self.clock = clock
+
+    def send(self, method, path, func, url, *args, **kwargs):
+        response = func(url, *args, **kwargs)
+        header = {'key': request_key(method, path, kwargs.get('params'),
+                                     kwargs.get('headers')),
+                  'time': self.clock(), 'url': url,
+                  'status': response.status_code, 'reason': response.reason,
+                  'elapsed': response.elapsed.total_seconds()}
+        self.capture.append(header, response.content)
+        return response
+
+    def close(self):
+        self.capture.close()
+
+
+class ReplayTransport(object):
+    """
+    Answer the requests with the responses of a capture file, see the
+    module documentation. Raises a :class:`BitfinexError` for a request
+    which was not recorded, whose responses were all replayed or, with a
+    clock, which was first recorded after the time of the clock.
+    """
+
+    def __init__(self, path, clock=None):
+        self.capture = CaptureFile(path, 'r')
+        self.clock = clock
+        if clock is not None and clock.now is None:
+            clock.now = self.capture.start_time
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    def send(self, method, path, func, url, *args, **kwargs):
+        key = request_key(method, path, kwargs.get('params'), kwargs.get('headers'))
+        entries = self.capture.index.get(key)
+        if not entries:
+            raise BitfinexError("No recorded response for %s %s" % (method, path))
+        if self.clock is None:
+            with self._lock:
+                position = self._cursors.get(key, 0)
+                if position >= len(entries):
+                    raise BitfinexError("All the recorded responses for %s %s "
+                                        "were replayed" % (method, path))
+                self._cursors[key] = position + 1
+        else:
+            # The last response at or before the time of the clock, never
+            # one from its future.
+            position = bisect.bisect_right(entries, (self.clock.time(), float('inf'))) - 1
+            if position < 0:
+                raise BitfinexError("No response for %s %s recorded yet at %s"
+                                    % (method, path, self.clock.time()))
+        header, content = self.capture.read(entries[position][1])
+        return CapturedResponse(header['url'], header['status'], header['reason'],
+                                content, header['elapsed'])
+
+    def close(self):
+        self.capture.close()
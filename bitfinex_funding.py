@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk management of margin funding offers on top of :class:`bitfinex.Trading`.
+
+:class:`OfferManager` keeps a local table of your active offers and credits,
+reconciled with one :meth:`Trading.offers` and one :meth:`Trading.credits`
+call rather than an :meth:`Trading.offer_status` call per offer, and sends
+batches of cancellations and new offers concurrently.
+
+    manager = OfferManager(client, 'USD')
+    manager.reconcile()
+    report = manager.reprice(lambda offer: 12.5)
+    report.latency, report.errors
+
+Bitfinex rejects a nonce smaller than the last one it received from the key,
+and concurrent requests may reach it out of order. The requests rejected
+for their nonce are sent again together, with new nonces, once the whole
+batch was answered, rather than each retried at once, which would race
+with the rest of the batch again. They were not executed, so this never
+submits an offer twice.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bitfinex import BitfinexError
+
+
+class BatchReport(object):
+    """
+    Outcome of a batch of cancellations and new offers.
+
+    cancelled	[list]	Responses of the offers cancelled.
+    created	[list]	Responses of the offers created.
+    errors	[list]	(request, exception) of the requests which failed.
+    retries	[int]	Number of requests sent again after their nonce was rejected.
+    cancel_latency	[float]	Seconds until all the cancellations were answered.
+    submit_latency	[float]	Seconds until all the new offers were answered.
+    latency	[float]	Seconds from the first request to the last answer.
+    """
+
+    def __init__(self):
+        self.cancelled = []
+        self.created = []
+        self.errors = []
+        self.retries = 0
+        self.cancel_latency = 0.0
+        self.submit_latency = 0.0
+        self.latency = 0.0
+
+    def __repr__(self):
+        return ('<BatchReport cancelled=%d created=%d errors=%d retries=%d '
+                'latency=%.3fs>' % (len(self.cancelled), len(self.created),
+                                    len(self.errors), self.retries, self.latency))
+
+
+class OfferManager(object):
+    """
+    Local table of the active funding offers and credits of a client,
+    optionally restricted to one ``currency``, with batch operations sending
+    up to ``workers`` requests at once, in up to ``rounds`` rounds. The
+    client's session should keep at least ``workers`` connections
+    (``pool_maxsize``).
+
+    ``offers`` and ``credits`` map ids to the dictionaries returned by the
+    API. They are updated by the batch operations and replaced by
+    :meth:`reconcile`.
+    """
+
+    def __init__(self, client, currency=None, workers=8, rounds=10,
+                 clock=time.time):
+        self.client = client
+        self.currency = currency and currency.upper()
+        self.workers = workers
+        self.rounds = rounds
+        self.clock = clock
+        self.offers = {}
+        self.credits = {}
+        self.reconciled_at = None
+
+    def _mine(self, record):
+        return self.currency is None or record.get('currency', '').upper() == self.currency
+
+    def reconcile(self):
+        """
+        Replace the table with a snapshot of the active offers and credits,
+        both requested at once. Returns a dictionary of what changed since
+        the last snapshot or batch:
+            gone	[list]	Offers no longer active: filled, expired or cancelled elsewhere.
+            new_offers	[list]	Offers made elsewhere.
+            new_credits	[list]	Credits which were not in the table.
+            closed_credits	[list]	Credits no longer active.
+        """
+        client = self.client
+        with ThreadPoolExecutor(2) as executor:
+            offers = executor.submit(client._retry_nonce, "offers", client.offers)
+            credits = executor.submit(client._retry_nonce, "credits", client.credits)
+            offers, credits = offers.result(), credits.result()
+        offers = dict((int(offer['id']), offer) for offer in offers if self._mine(offer))
+        credits = dict((int(credit['id']), credit) for credit in credits
+                       if self._mine(credit))
+        changes = {
+            'gone': [self.offers[key] for key in self.offers if key not in offers],
+            'new_offers': [offers[key] for key in offers if key not in self.offers],
+            'new_credits': [credits[key] for key in credits if key not in self.credits],
+            'closed_credits': [self.credits[key] for key in self.credits
+                               if key not in credits],
+        }
+        self.offers, self.credits = offers, credits
+        self.reconciled_at = self.clock()
+        return changes
+
+    def _run(self, calls, report, done):
+        """
+        Make the (request, method, args) calls concurrently, calling
+        ``done(request, response)`` for each success. The calls rejected
+        for their nonce are made again in another round, up to ``rounds``
+        in all. Returns the seconds until the last answer.
+        """
+        start = time.time()
+
+        def call(item):
+            request, method, args = item
+            try:
+                return item, method(*args), None
+            except Exception as error:
+                return item, None, error
+
+        pending = list(calls)
+        for attempt in range(self.rounds):
+            if not pending:
+                break
+            if attempt:
+                report.retries += len(pending)
+            rejected = []
+            with ThreadPoolExecutor(min(self.workers, len(pending))) as executor:
+                for item, response, error in executor.map(call, pending):
+                    if error is None:
+                        done(item[0], response)
+                    elif (isinstance(error, BitfinexError)
+                          and 'nonce' in str(error).lower()):
+                        rejected.append(item)
+                    else:
+                        report.errors.append((item[0], error))
+            pending = rejected
+        report.errors.extend((item[0], BitfinexError("Nonce rejected %d times"
+                                                     % self.rounds))
+                             for item in pending)
+        return time.time() - start
+
+    def _cancel(self, offer_ids, report):
+        def done(offer_id, response):
+            self.offers.pop(offer_id, None)
+            report.cancelled.append(response)
+        calls = [(int(offer_id), self.client.offer_cancel, (int(offer_id),))
+                 for offer_id in offer_ids]
+        report.cancel_latency = self._run(calls, report, done)
+
+    def _submit(self, new_offers, report):
+        def done(request, response):
+            self.offers[int(response['id'])] = response
+            report.created.append(response)
+        calls = []
+        for offer in new_offers:
+            args = (offer.get('currency') or self.currency, offer['amount'],
+                    offer['rate'], offer['period'], offer.get('direction', 'lend'))
+            calls.append((offer, self.client.offer_new, args))
+        report.submit_latency = self._run(calls, report, done)
+
+    def cancel(self, offer_ids):
+        """
+        Cancel offers concurrently. Returns a :class:`BatchReport`.
+        """
+        report = BatchReport()
+        self._cancel(offer_ids, report)
+        report.latency = report.cancel_latency
+        return report
+
+    def submit(self, new_offers):
+        """
+        Make new offers concurrently. ``new_offers`` are dictionaries with
+        the amount, rate, period and optionally the direction ('lend' by
+        default) and currency (the manager's by default) of each offer.
+        Returns a :class:`BatchReport`.
+        """
+        report = BatchReport()
+        self._submit(new_offers, report)
+        report.latency = report.submit_latency
+        return report
+
+    def replace(self, offer_ids, new_offers):
+        """
+        Cancel offers, then once they are all answered, so that their funds
+        are available again, make the new offers. Returns a
+        :class:`BatchReport`.
+        """
+        report = BatchReport()
+        self._cancel(offer_ids, report)
+        self._submit(new_offers, report)
+        report.latency = report.cancel_latency + report.submit_latency
+        return report
+
+    def reprice(self, rate_for, direction='lend'):
+        """
+        Replace the offers of the table in ``direction`` whose rate should
+        change by offers of their remaining amount at the new rate.
+        ``rate_for(offer)`` returns the new rate of an offer, or None to
+        leave it. Offers whose cancellation failed, or which were filled in
+        the meantime, are not replaced.
+        Returns a :class:`BatchReport`.
+        """
+        replaced = {}
+        for offer_id, offer in list(self.offers.items()):
+            if offer.get('direction', direction) != direction:
+                continue
+            rate = rate_for(offer)
+            if rate is None or float(rate) == float(offer['rate']):
+                continue
+            replaced[offer_id] = {'currency': offer['currency'],
+                                  'amount': offer['remaining_amount'],
+                                  'rate': rate, 'period': int(offer['period']),
+                                  'direction': direction}
+        report = BatchReport()
+        self._cancel(list(replaced), report)
+        # The cancellations tell how much was left of the offers.
+        new_offers = []
+        for response in report.cancelled:
+            offer = replaced[int(response['id'])]
+            amount = response.get('remaining_amount', offer['amount'])
+            if float(amount) > 0:
+                offer['amount'] = amount
+                new_offers.append(offer)
+        self._submit(new_offers, report)
+        report.latency = report.cancel_latency + report.submit_latency
+        return report
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Local view of the wallet balances of an account, kept up to date from the
+new balance ledger entries rather than full pulls.
+
+:class:`WalletTracker` loads the balances once with :meth:`Trading.balances`,
+then each :meth:`WalletTracker.poll` requests, for each currency, only the
+ledger entries since the last one seen. An entry carries the balance of its
+wallet after it, so the newest entry of a wallet gives its balance exactly,
+whatever entries were missed or seen twice. Every ``verify_every`` seconds
+a poll also compares the view with :meth:`Trading.balances` and corrects
+it.
+
+    tracker = WalletTracker(client)
+    tracker.on_change(lambda wallet, currency, amount, previous: ...)
+    tracker.start()
+    while True:
+        tracker.poll()
+        tracker.balance('USD', 'exchange')
+        time.sleep(5)
+
+The wallet of an entry is read from the end of its description ('... on
+wallet exchange'). The available amounts come from the balances and move
+with the ledger entries in between, not with the orders placed: they are
+exact after each check only. A currency appearing in a wallet after
+:meth:`WalletTracker.start` is tracked from the next check, unless it is
+given in ``currencies``.
+"""
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from bitfinex import _record_key
+
+logger = logging.getLogger('bitfinex')
+
+_WALLET = re.compile(r'on wallet (\w+)\s*$')
+
+
+def _decimal(value):
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+class WalletTracker(object):
+    """
+    Balances of the wallets of the account of ``client``, see the module
+    documentation.
+
+    Input:
+        client	[Trading]	Client of the account.
+        currencies	[list]	Optional. Currencies to follow besides the ones with a balance.
+        verify_every	[float]	Seconds between the checks against the balances, None to never check.
+        limit	[int]	Ledger entries requested per page.
+        workers	[int]	Currencies whose ledger is requested at once.
+        clock	[callable]	Optional. Returns the current time in seconds.
+        margin	[float]	Seconds before the first balances from which the ledger is read, for the clock skew.
+    """
+
+    def __init__(self, client, currencies=None, verify_every=60.0, limit=500,
+                 workers=1, clock=time.time, margin=5.0):
+        self.client = client
+        self.verify_every = verify_every
+        self.limit = limit
+        self.workers = workers
+        self.clock = clock
+        self.margin = margin
+        self.currencies = set(currency.upper() for currency in currencies or ())
+        # (wallet, currency): [amount, available]
+        self._view = {}
+        # currency: (timestamp of the newest entry seen, keys of the
+        # entries seen at that timestamp)
+        self._cursors = {}
+        self._callbacks = []
+        self._lock = threading.RLock()
+        self.verified_at = None
+        self.stats = {'polls': 0, 'entries': 0, 'changes': 0,
+                      'checks': 0, 'drift': 0, 'unknown_wallet': 0}
+
+    def on_change(self, callback):
+        """
+        Call ``callback(wallet, currency, amount, previous)`` whenever the
+        amount of a wallet changes, with Decimal amounts.
+        """
+        self._callbacks.append(callback)
+
+    def start(self):
+        """
+        Load the balances. The ledger is followed from then on.
+        """
+        since = self.clock() - self.margin
+        self.verify()
+        with self._lock:
+            for currency in self.currencies:
+                self._cursors.setdefault(currency, (since, set()))
+
+    def poll(self):
+        """
+        Apply the new ledger entries of every currency, and check the view
+        against the balances if ``verify_every`` elapsed. Returns the list
+        of (wallet, currency, amount, previous) changes.
+        """
+        if self.verified_at is None:
+            self.start()
+        changes = []
+        currencies = sorted(self.currencies)
+        if self.workers > 1 and len(currencies) > 1:
+            # The client still sends the signed requests one at a time.
+            with ThreadPoolExecutor(min(self.workers, len(currencies))) as executor:
+                for currency_changes in executor.map(self._poll_currency, currencies):
+                    changes += currency_changes
+        else:
+            for currency in currencies:
+                changes += self._poll_currency(currency)
+        if (self.verify_every is not None
+                and self.clock() - self.verified_at >= self.verify_every):
+            changes += self.verify()
+        self.stats['polls'] += 1
+        return changes
+
+    def _poll_currency(self, currency):
+        since, seen = self._cursors[currency]
+        entries = []
+        # The entries at the cursor were requested again: skip those seen.
+        for entry in self.client.iter_historical_balance(
+                currency, since=repr(since), limit=self.limit):
+            timestamp = float(entry['timestamp'])
+            if timestamp < since or (timestamp == since and _record_key(entry) in seen):
+                continue
+            entries.append((timestamp, entry))
+        if not entries:
+            return []
+        with self._lock:
+            self.stats['entries'] += len(entries)
+        newest = max(timestamp for timestamp, entry in entries)
+        if newest > since:
+            seen = set()
+        seen.update(_record_key(entry) for timestamp, entry in entries
+                    if timestamp == newest)
+
+        # The first entry of a wallet is its newest.
+        latest = {}
+        for timestamp, entry in entries:
+            match = _WALLET.search(entry.get('description') or '')
+            if match is None:
+                with self._lock:
+                    self.stats['unknown_wallet'] += 1
+                continue
+            latest.setdefault(match.group(1), entry)
+
+        changes = []
+        with self._lock:
+            self._cursors[currency] = (newest, seen)
+            for wallet, entry in latest.items():
+                changes += self._set(wallet, currency, _decimal(entry['balance']))
+        self._notify(changes)
+        return changes
+
+    def _set(self, wallet, currency, amount, available=None):
+        """
+        Set the amount of a wallet, and its available amount or else move
+        it by as much. Returns the change, if any, in a list.
+        """
+        balance = self._view.get((wallet, currency))
+        if balance is None:
+            balance = self._view[(wallet, currency)] = [Decimal(0), Decimal(0)]
+        previous = balance[0]
+        balance[1] = available if available is not None else balance[1] + amount - previous
+        if amount == previous:
+            return []
+        balance[0] = amount
+        return [(wallet, currency, amount, previous)]
+
+    def _notify(self, changes):
+        with self._lock:
+            self.stats['changes'] += len(changes)
+        for change in changes:
+            for callback in self._callbacks:
+                try:
+                    callback(*change)
+                except Exception:
+                    logger.exception('Wallet change callback failed')
+
+    def verify(self):
+        """
+        Compare the view with the balances, correct it and follow the new
+        currencies. Returns the list of (wallet, currency, amount,
+        previous) corrections, empty unless the view had drifted.
+        """
+        since = self.clock() - self.margin
+        balances = self.client.balances()
+        changes = []
+        with self._lock:
+            first = self.verified_at is None
+            remote = set()
+            for balance in balances:
+                currency = balance['currency'].upper()
+                key = (balance['type'], currency)
+                remote.add(key)
+                changes += self._set(key[0], currency, _decimal(balance['amount']),
+                                     _decimal(balance['available']))
+                self.currencies.add(currency)
+                self._cursors.setdefault(currency, (since, set()))
+            for key in set(self._view) - remote:
+                changes += self._set(key[0], key[1], Decimal(0), Decimal(0))
+            self.verified_at = self.clock()
+        if first:
+            changes = []
+        else:
+            self.stats['checks'] += 1
+            self.stats['drift'] += len(changes)
+            for wallet, currency, amount, previous in changes:
+                logger.warning('Wallet %s %s was %s, not %s', wallet, currency,
+                               amount, previous)
+            self._notify(changes)
+        return changes
+
+    def balance(self, currency, wallet='exchange'):
+        """
+        Amount of ``currency`` in ``wallet``, as a Decimal.
+        """
+        balance = self._view.get((wallet, currency.upper()))
+        return balance[0] if balance is not None else Decimal(0)
+
+    def available(self, currency, wallet='exchange'):
+        """
+        Amount of ``currency`` available in ``wallet``, as a Decimal.
+        """
+        balance = self._view.get((wallet, currency.upper()))
+        return balance[1] if balance is not None else Decimal(0)
+
+    def wallet(self, wallet):
+        """
+        Dictionary of the amounts of ``wallet`` by currency.
+        """
+        with self._lock:
+            return dict((currency, balance[0])
+                        for (name, currency), balance in self._view.items()
+                        if name == wallet)
+
+    def snapshot(self):
+        """
+        Same output as :meth:`Trading.balances`, from the view.
+        """
+        with self._lock:
+            return [{'type': wallet, 'currency': currency.lower(),
+                     'amount': str(balance[0]), 'available': str(balance[1])}
+                    for (wallet, currency), balance in sorted(self._view.items())]
+
+    def run(self, interval=5.0, stop=None):
+        """
+        Poll every ``interval`` seconds until the ``stop`` threading.Event
+        is set. Failed polls are logged and tried again at the next one.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Wallet poll failed')
+            stop.wait(interval)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Typed records built from the responses of :class:`bitfinex.Public` and
+:class:`bitfinex.Trading`, lighter than their dictionaries.
+
+A record keeps the fields of its response in slots, parsed once when it
+is built: numbers into floats, and the strings naming a currency, side or
+status shared between the records. Reading a field then costs a plain
+attribute lookup. Lists of records turn into ``array.array('d')`` columns,
+or NumPy arrays, in one call.
+
+    trades = Trade.from_response(client.trades('BTCUSD'))
+    trades[0].price + 1
+    columns = trades.columns('timestamp', 'price', 'amount')
+    bids, asks = BookLevel.from_book(client.orderbook('BTCUSD'))
+
+Numbers already converted by a client with ``numbers='float'`` or
+``numbers='decimal'`` are kept as they are.
+"""
+from array import array
+from operator import attrgetter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    string_types = (str, unicode)
+except NameError:
+    string_types = (str,)
+
+_NAN = float('nan')
+
+# Values of the fields in Record.shared, one string object each.
+_shared = {}
+
+
+class Record(object):
+    """
+    Base class of the records. ``fields`` lists the fields of the response
+    kept, ``numbers`` the ones parsed into floats and ``shared`` the ones
+    whose few distinct values are shared between the records.
+    """
+    __slots__ = ()
+    fields = ()
+    numbers = ()
+    shared = ()
+    _parsers = ()
+
+    def __init__(self, response):
+        get = response.get
+        for name, parse in self._parsers:
+            value = get(name)
+            if parse is not None and value is not None:
+                value = parse(value)
+            setattr(self, name, value)
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        Record of a dictionary response, or :class:`RecordList` of a list.
+        """
+        if isinstance(response, dict):
+            return cls(response)
+        return RecordList(cls, [cls(item) for item in response])
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.fields)
+
+    def get(self, name, default=None):
+        value = getattr(self, name)
+        return default if value is None else value
+
+    def as_dict(self):
+        """
+        Dictionary of the fields present in the response, numbers parsed.
+        """
+        return dict((name, value) for name, value in zip(self.fields, self._values())
+                    if value is not None)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return self._values()
+
+    def __setstate__(self, values):
+        for name, value in zip(self.fields, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % item for item in zip(self.fields, self._values())
+            if item[1] is not None))
+
+
+def _number(value):
+    # Numbers already converted by the client are kept as they are.
+    return float(value) if value.__class__ in string_types else value
+
+
+def _share(value):
+    return _shared.setdefault(value, value)
+
+
+def _record_class(name, fields, numbers, shared, doc):
+    """
+    Subclass of :class:`Record` with a slot per field.
+    """
+    return type(name, (Record,), {
+        '__slots__': fields, '__doc__': doc, 'fields': fields,
+        'numbers': numbers, 'shared': shared,
+        '_parsers': tuple((field, _number if field in numbers else
+                           _share if field in shared else None)
+                          for field in fields)})
+
+
+Ticker = _record_class('Ticker', (
+    'mid', 'bid', 'ask', 'last_price', 'low', 'high', 'volume', 'timestamp'), (
+    'mid', 'bid', 'ask', 'last_price', 'low', 'high', 'volume', 'timestamp'), (), """
+    Response of :meth:`Public.ticker`.
+    """)
+
+Trade = _record_class('Trade', (
+    'tid', 'timestamp', 'price', 'amount', 'exchange', 'type',
+    'fee_currency', 'fee_amount', 'order_id'), (
+    'timestamp', 'price', 'amount', 'fee_amount'), (
+    'exchange', 'type', 'fee_currency'), """
+    Trade of :meth:`Public.trades` or :meth:`Trading.past_trades`.
+    """)
+
+
+class BookLevel(_record_class('BookLevel', (
+        'price', 'rate', 'amount', 'period', 'timestamp', 'frr'), (
+        'price', 'rate', 'amount', 'period', 'timestamp'), ('frr',), None)):
+    """
+    Level of :meth:`Public.orderbook` or :meth:`Public.fundingbook`.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_book(cls, response):
+        """
+        (bids, asks) :class:`RecordList` of an order book or funding book.
+        """
+        return (cls.from_response(response.get('bids', [])),
+                cls.from_response(response.get('asks', [])))
+
+
+LedgerEntry = _record_class('LedgerEntry', (
+    'currency', 'amount', 'balance', 'description', 'timestamp'), (
+    'amount', 'balance', 'timestamp'), ('currency',), """
+    Entry of :meth:`Trading.historical_balance`.
+    """)
+
+Offer = _record_class('Offer', (
+    'id', 'currency', 'rate', 'period', 'direction', 'timestamp', 'is_live',
+    'is_cancelled', 'original_amount', 'remaining_amount', 'executed_amount'), (
+    'rate', 'timestamp', 'original_amount', 'remaining_amount',
+    'executed_amount'), ('currency', 'direction'), """
+    Funding offer of :meth:`Trading.offers` or :meth:`Trading.offer_status`.
+    """)
+
+Credit = _record_class('Credit', (
+    'id', 'currency', 'status', 'rate', 'period', 'amount', 'timestamp'), (
+    'rate', 'amount', 'timestamp'), ('currency', 'status'), """
+    Funding credit of :meth:`Trading.credits`.
+    """)
+
+Balance = _record_class('Balance', (
+    'type', 'currency', 'amount', 'available'), (
+    'amount', 'available'), ('type', 'currency'), """
+    Wallet balance of :meth:`Trading.balances`.
+    """)
+
+
+class RecordList(list):
+    """
+    List of records of one class, with column conversions.
+    """
+
+    def __init__(self, record_class, records=()):
+        super(RecordList, self).__init__(records)
+        self.record_class = record_class
+
+    def columns(self, *names):
+        """
+        Dictionary of ``array.array('d')`` by numeric field, all of them if
+        no ``names`` are given. Missing values are NaN.
+        """
+        names = names or self.record_class.numbers
+        columns = {}
+        for name in names:
+            values = list(map(attrgetter(name), self))
+            try:
+                columns[name] = array('d', map(float, values))
+            except TypeError:
+                columns[name] = array('d', [_NAN if value is None else float(value)
+                                            for value in values])
+        return columns
+
+    def as_numpy(self, *names):
+        """
+        Same as :meth:`columns` with NumPy arrays, sharing the memory of the
+        columns. Requires NumPy.
+        """
+        if numpy is None:
+            raise ImportError("as_numpy requires NumPy")
+        return dict((name, numpy.frombuffer(column, dtype=numpy.float64))
+                    for name, column in self.columns(*names).items())
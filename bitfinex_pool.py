@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Spread the read-only authenticated calls over several API keys.
+
+Bitfinex limits the rate of the signed requests of each key, and orders
+them by the nonce of the key. :class:`TradingPool` holds one
+:class:`bitfinex.Trading` client per key, each with its own nonces, and
+sends every call with the key least loaded or with the most rate budget
+left. The signed requests of a key are sent one at a time, so that their
+nonces reach Bitfinex in order: the calls run at once on different keys.
+
+    pool = TradingPool([(key1, secret1), (key2, secret2)], nonce_dir='~/.bfx')
+    pool.balances()
+    pool.past_trades('BTCUSD', since)
+
+The keys should belong to the same account, as the calls of the pool return
+the data of whichever key sent them.
+
+A pool can be used from several threads. Worker processes each use their
+own pool, built alike or pickled from the parent: the nonces of a key are
+then drawn from a state file in ``nonce_dir``, shared by the processes,
+which also send the requests of the key one at a time. Each process should
+get its share of the rate ``limit`` of a key.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from bitfinex import (BitfinexError, BitfinexHTTPError, NonceGenerator,
+                      RequestScheduler, SymbolRegistry, TokenBucket, Trading)
+
+
+class KeySlot(object):
+    """
+    A key of a pool: its client, rate budget and counters.
+    """
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+        self.in_flight = 0
+        self.requests = 0
+        self.resent = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    @property
+    def key(self):
+        return self.client.key
+
+
+class TradingPool(object):
+    """
+    Trading clients of several keys, see the module documentation.
+
+    Input:
+        credentials	[list]	(key, secret) of each API key.
+        strategy	[string]	'least_loaded' sends with the key with the fewest calls running, 'budget' with the key with the most rate budget left.
+        limit	[tuple]	(requests, period in seconds) allowed to each key, waited for when every key used it up. None for no limit.
+        nonce_dir	[string]	Optional. Directory of the nonce state files of the keys, required when several processes use the keys.
+        retries	[int]	Number of times a call rejected for its nonce or rate limit is sent again.
+        client_class	[class]	Class of the clients, Trading by default.
+        clock	[callable]	Optional. Returns the current time in seconds.
+        **kwargs	Passed to the clients, e.g. pool_maxsize.
+    """
+    strategies = ('least_loaded', 'budget')
+
+    def __init__(self, credentials, strategy='least_loaded',
+                 limit=RequestScheduler.default_limits['auth'], nonce_dir=None,
+                 retries=3, client_class=Trading, clock=None, **kwargs):
+        if strategy not in self.strategies:
+            raise ValueError("strategy must be one of %s" % ', '.join(self.strategies))
+        credentials = list(credentials)
+        if not credentials:
+            raise ValueError("A pool needs at least one key")
+        self._args = (credentials, strategy, limit, nonce_dir, retries,
+                      client_class, clock, kwargs)
+        self.strategy = strategy
+        self.limit = limit
+        self.retries = retries
+        self.clock = clock or getattr(time, 'monotonic', time.time)
+        if nonce_dir:
+            nonce_dir = os.path.expanduser(nonce_dir)
+            if not os.path.isdir(nonce_dir):
+                os.makedirs(nonce_dir)
+        # The symbols are loaded once for all the keys.
+        kwargs = dict(kwargs)
+        kwargs.setdefault('symbol_registry', SymbolRegistry())
+        self.slots = []
+        for key, secret in credentials:
+            state_file = None
+            if nonce_dir:
+                state_file = os.path.join(nonce_dir, 'nonce-%s'
+                                          % hashlib.sha256(key.encode('utf-8')).hexdigest()[:16])
+            client = client_class(key, secret, check_credentials=False,
+                                  nonce_generator=NonceGenerator(state_file, serialize=True),
+                                  **kwargs)
+            bucket = None
+            if limit:
+                bucket = TokenBucket(float(limit[0]) / limit[1], limit[0], self.clock())
+            self.slots.append(KeySlot(client, bucket))
+        self._cond = threading.Condition()
+
+    def __reduce__(self):
+        # Sessions cannot be pickled: a pickled pool is built again.
+        return (_rebuild, (self._args,))
+
+    def _checkout(self, exclude=None):
+        """
+        Pick the key of the next call, waiting for rate budget if needed.
+        """
+        with self._cond:
+            while True:
+                now = self.clock()
+                delays = []
+                best = None
+                for slot in self.slots:
+                    if slot is exclude and len(self.slots) > 1:
+                        continue
+                    delay = slot.bucket.delay(now) if slot.bucket is not None else 0.0
+                    if delay > 0:
+                        delays.append(delay)
+                    elif best is None or self._better(slot, best):
+                        best = slot
+                if best is not None:
+                    break
+                self._cond.wait(min(delays))
+            if best.bucket is not None:
+                best.bucket.consume()
+            best.in_flight += 1
+            best.requests += 1
+            return best
+
+    def _better(self, slot, other):
+        if self.strategy == 'budget' and slot.bucket is not None:
+            return slot.bucket.tokens > other.bucket.tokens
+        return (slot.in_flight, slot.requests) < (other.in_flight, other.requests)
+
+    def _checkin(self, slot):
+        with self._cond:
+            slot.in_flight -= 1
+            self._cond.notify_all()
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call ``method`` of the client of a key of the pool. Calls rejected
+        for their nonce or the rate limit of the key were not executed, and
+        are sent again, after another key when one is rate limited.
+        """
+        exclude = None
+        for attempt in range(self.retries + 1):
+            slot = self._checkout(exclude)
+            try:
+                return getattr(slot.client, method)(*args, **kwargs)
+            except BitfinexError as error:
+                rate_limited = isinstance(error, BitfinexHTTPError) and error.status_code == 429
+                retry = (rate_limited or 'nonce' in str(error).lower()) and attempt < self.retries
+                with self._cond:
+                    if rate_limited:
+                        slot.rate_limited += 1
+                        if slot.bucket is not None:
+                            slot.bucket.tokens = min(slot.bucket.tokens, 0.0)
+                    if retry:
+                        slot.resent += 1
+                    else:
+                        slot.errors += 1
+                if not retry:
+                    raise
+                exclude = slot if rate_limited else None
+            finally:
+                self._checkin(slot)
+
+    def balances(self):
+        """
+        See :meth:`bitfinex.Trading.balances`.
+        """
+        return self.call('balances')
+
+    def offers(self):
+        """
+        See :meth:`bitfinex.Trading.offers`.
+        """
+        return self.call('offers')
+
+    def credits(self):
+        """
+        See :meth:`bitfinex.Trading.credits`.
+        """
+        return self.call('credits')
+
+    def taken_funds(self):
+        """
+        See :meth:`bitfinex.Trading.taken_funds`.
+        """
+        return self.call('taken_funds')
+
+    def historical_balance(self, *args, **kwargs):
+        """
+        See :meth:`bitfinex.Trading.historical_balance`.
+        """
+        return self.call('historical_balance', *args, **kwargs)
+
+    def past_trades(self, *args, **kwargs):
+        """
+        See :meth:`bitfinex.Trading.past_trades`.
+        """
+        return self.call('past_trades', *args, **kwargs)
+
+    def stats(self):
+        """
+        Returns dictionary of dictionaries by key.
+        in_flight	[int]	Calls running.
+        requests	[int]	Calls sent, retries included.
+        resent	[int]	Calls sent again after their nonce or rate limit was rejected.
+        errors	[int]	Calls which failed.
+        rate_limited	[int]	Calls rejected by the rate limit of the key.
+        """
+        with self._cond:
+            return dict((slot.key, {'in_flight': slot.in_flight,
+                                    'requests': slot.requests,
+                                    'resent': slot.resent,
+                                    'errors': slot.errors,
+                                    'rate_limited': slot.rate_limited})
+                        for slot in self.slots)
+
+    def close(self):
+        for slot in self.slots:
+            slot.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _rebuild(args):
+    credentials, strategy, limit, nonce_dir, retries, client_class, clock, kwargs = args
+    return TradingPool(credentials, strategy, limit, nonce_dir, retries,
+                       client_class, clock, **kwargs)
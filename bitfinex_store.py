@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Local append-only store of public trades and account trades.
+
+Each symbol has one binary file of fixed size records, appended in
+timestamp order, so the file is its own index: ranges are found by binary
+search on the memory mapped file and read back without parsing json.
+
+    store = TradeStore('~/bitfinex-data')
+    store.sync(client, 'BTCUSD')            # only requests the new trades
+    trades = store.read('BTCUSD', start=1444000000, end=1445000000)
+
+With NumPy installed, :meth:`TradeStore.read` returns a record array
+viewing the mapped file, else a list of tuples.
+"""
+import mmap
+import os
+import struct
+import threading
+
+from bitfinex import BitfinexGapError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TRADE_TYPES = {'buy': 1, 'sell': -1}
+
+
+def _trade_type(record):
+    return TRADE_TYPES.get(str(record.get('type', '')).lower(), 0)
+
+
+def _layout(columns):
+    """
+    Struct of a record with the (name, struct code) columns, padded to a
+    multiple of 8 bytes, and the offsets of the columns.
+    """
+    offsets, size = {}, 0
+    for name, code in columns:
+        offsets[name] = size
+        size += struct.calcsize('<' + code)
+    padding = -size % 8
+    fmt = '<' + ''.join(code for name, code in columns) + (
+        '%dx' % padding if padding else '')
+    return struct.Struct(fmt), offsets
+
+
+NUMPY_TYPES = {'q': '<i8', 'd': '<f8', 'b': 'i1', '4s': 'S4'}
+
+
+class TradeFile(object):
+    """
+    File of the public trades of one symbol, as returned by
+    :meth:`Public.trades`. The type is 1 for buy, -1 for sell, 0 if
+    undetermined.
+    """
+    columns = (('tid', 'q'), ('timestamp', 'd'), ('price', 'd'),
+               ('amount', 'd'), ('type', 'b'))
+    record, offsets = _layout(columns)
+
+    def __init__(self, path):
+        self.path = path
+        self.gaps_path = path + '.gaps'
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path) // self.record.size
+        except OSError:
+            return 0
+
+    def pack(self, record):
+        return self.record.pack(int(record['tid']), float(record['timestamp']),
+                                float(record['price']), float(record['amount']),
+                                _trade_type(record))
+
+    def append(self, records):
+        """
+        Append records, which must be sorted by timestamp and not older than
+        the last stored one. Returns the number of records written.
+        """
+        count = 0
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                chunk = []
+                for record in records:
+                    chunk.append(self.pack(record))
+                    if len(chunk) == 1000:
+                        f.write(b''.join(chunk))
+                        count += len(chunk)
+                        chunk = []
+                f.write(b''.join(chunk))
+                count += len(chunk)
+        return count
+
+    def add_gap(self, start, end):
+        """
+        Record that trades between the timestamps ``start`` and ``end`` may
+        be missing from the file.
+        """
+        with self._lock:
+            with open(self.gaps_path, 'a') as f:
+                f.write('%r %r\n' % (float(start), float(end)))
+
+    def gaps(self):
+        """
+        List of the (start, end) timestamps between which trades may be
+        missing, oldest first.
+        """
+        try:
+            with open(self.gaps_path) as f:
+                return [tuple(float(value) for value in line.split())
+                        for line in f if line.strip()]
+        except IOError:
+            return []
+
+    def _map(self):
+        if not len(self):
+            return None
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _timestamp(self, mapped, index):
+        return struct.unpack_from('<d', mapped, index * self.record.size
+                                  + self.offsets['timestamp'])[0]
+
+    def _search(self, mapped, count, timestamp):
+        # Index of the first record at or after the timestamp.
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamp(mapped, mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def tail(self):
+        """
+        Timestamp of the last record, and the set of the tids stored at that
+        timestamp. (None, empty set) if the file is empty.
+        """
+        mapped = self._map()
+        if mapped is None:
+            return None, set()
+        count = len(mapped) // self.record.size
+        last = self._timestamp(mapped, count - 1)
+        start = self._search(mapped, count, last)
+        tids = set(struct.unpack_from('<q', mapped, index * self.record.size
+                                      + self.offsets['tid'])[0]
+                   for index in range(start, count))
+        mapped.close()
+        return last, tids
+
+    def dtype(self):
+        """
+        NumPy dtype of the records.
+        """
+        return numpy.dtype({'names': [name for name, code in self.columns],
+                            'formats': [NUMPY_TYPES[code] for name, code in self.columns],
+                            'offsets': [self.offsets[name] for name, code in self.columns],
+                            'itemsize': self.record.size})
+
+    def read(self, start=None, end=None):
+        """
+        Records with ``start <= timestamp < end``. A NumPy record array
+        viewing the file if NumPy is installed, else a list of tuples.
+        """
+        mapped = self._map()
+        if mapped is None:
+            return numpy.recarray(0, dtype=self.dtype()) if numpy is not None else []
+        count = len(mapped) // self.record.size
+        first = 0 if start is None else self._search(mapped, count, float(start))
+        last = count if end is None else self._search(mapped, count, float(end))
+        last = max(last, first)
+        if numpy is not None:
+            return numpy.frombuffer(mapped, dtype=self.dtype(), count=last - first,
+                                    offset=first * self.record.size).view(numpy.recarray)
+        size = self.record.size
+        records = [self.record.unpack_from(mapped, index * size)
+                   for index in range(first, last)]
+        mapped.close()
+        return records
+
+
+class AccountTradeFile(TradeFile):
+    """
+    File of your trades of one symbol, as returned by
+    :meth:`Trading.past_trades`.
+    """
+    columns = (('tid', 'q'), ('order_id', 'q'), ('timestamp', 'd'),
+               ('price', 'd'), ('amount', 'd'), ('fee_amount', 'd'),
+               ('fee_currency', '4s'), ('type', 'b'))
+    record, offsets = _layout(columns)
+
+    def pack(self, record):
+        return self.record.pack(int(record['tid']), int(record.get('order_id') or 0),
+                                float(record['timestamp']), float(record['price']),
+                                float(record['amount']),
+                                float(record.get('fee_amount') or 0),
+                                str(record.get('fee_currency') or '').encode('ascii'),
+                                _trade_type(record))
+
+
+class TradeStore(object):
+    """
+    Directory of :class:`TradeFile`, one per symbol, synchronized with
+    :meth:`Public.iter_trades`. A file must only be appended to by one
+    store at a time.
+    """
+    file_class = TradeFile
+    kind = 'trades'
+
+    def __init__(self, root):
+        self.root = os.path.join(os.path.expanduser(root), self.kind)
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        self._files = {}
+
+    def open(self, symbol):
+        symbol = symbol.lower()
+        if symbol not in self._files:
+            path = os.path.join(self.root, symbol + '.bin')
+            self._files[symbol] = self.file_class(path)
+        return self._files[symbol]
+
+    def _fetch(self, client, symbol, since):
+        return client.iter_trades(symbol, since, strict=True)
+
+    def sync(self, client, symbol, since=None, allow_gap=False):
+        """
+        Append the records newer than the last stored one, requested from
+        its timestamp (or from ``since`` if the file is empty). Returns the
+        number of records appended.
+
+        When more records came since the last one than the API returns at
+        once, the file is left without gaps and a :class:`BitfinexGapError`
+        raised: sync more often. With ``allow_gap`` the latest records are
+        appended instead, and the gap is recorded, see :meth:`gaps`.
+        """
+        trade_file = self.open(symbol)
+        try:
+            return self._append(trade_file, client, symbol, since)
+        except BitfinexGapError:
+            if not allow_gap:
+                raise
+        last = trade_file.tail()[0]
+        if last is None:
+            last = since
+        first = []
+        count = self._append(trade_file, client, symbol, None, first)
+        if first and last is not None:
+            trade_file.add_gap(last, first[0])
+        return count
+
+    def _append(self, trade_file, client, symbol, since, first=None):
+        """
+        Append the records fetched from ``since``, or from the last stored
+        one unless ``first`` is given to collect the timestamp of the first
+        record appended.
+        """
+        last, tids = trade_file.tail()
+        if last is not None and first is None:
+            since = last
+
+        def fresh(records):
+            for record in records:
+                timestamp = float(record['timestamp'])
+                if last is None or timestamp > last or (
+                        timestamp == last and int(record['tid']) not in tids):
+                    if first is not None and not first:
+                        first.append(timestamp)
+                    yield record
+        return trade_file.append(fresh(self._fetch(client, symbol, since)))
+
+    def gaps(self, symbol):
+        """
+        (start, end) timestamps between which records of a symbol may be
+        missing, see :meth:`TradeFile.gaps`.
+        """
+        return self.open(symbol).gaps()
+
+    def read(self, symbol, start=None, end=None):
+        """
+        Records of a symbol with ``start <= timestamp < end``, see
+        :meth:`TradeFile.read`.
+        """
+        return self.open(symbol).read(start, end)
+
+
+class AccountTradeStore(TradeStore):
+    """
+    Directory of :class:`AccountTradeFile`, one per symbol, synchronized
+    with :meth:`Trading.iter_past_trades`.
+    """
+    file_class = AccountTradeFile
+    kind = 'mytrades'
+
+    def _fetch(self, client, symbol, since):
+        return client.iter_past_trades(symbol, since or 0)
@@ -0,0 +1,599 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming of tickers, order books and trades from the Bitfinex websocket
+API, built on asyncio and aiohttp.
+
+:class:`Stream` subscribes to the public channels and keeps, for each
+symbol, the last ticker, a :class:`LocalBook` updated incrementally and a
+:class:`TradeBuffer` of the latest trades. Updates are delivered to
+callbacks and to async iterators:
+
+    async with Stream(rest_client=AsyncPublic()) as stream:
+        book = stream.subscribe_book('BTCUSD')
+        stream.subscribe_trades('BTCUSD')
+        stream.on('ticker', print)
+        async for symbol, trade in stream.updates('trades'):
+            print(book.best_bid(), trade['price'])
+
+The stream uses version 2 of the websocket API, the one with sequence
+numbers and order book checksums. When a message is missing or a checksum
+does not match, the book is loaded from :meth:`Public.orderbook` with
+``rest_client`` if any, missed trades are requested with
+:meth:`Public.trades`, and the channel is subscribed again for a fresh
+snapshot. The connection is opened again when it is lost or silent.
+Errors of the callbacks, and messages which cannot be applied, are logged
+and counted in ``stats`` without stopping the stream.
+
+Tickers and trades have the keys of the REST responses, with numbers as
+floats. Requires Python 3.5+ and aiohttp.
+"""
+import asyncio
+import collections
+import functools
+import heapq
+import json
+import logging
+import time
+import zlib
+from decimal import Decimal
+
+import aiohttp
+
+from bitfinex_book import OrderBook
+
+logger = logging.getLogger('bitfinex')
+
+WS_URL = 'wss://api-pub.bitfinex.com/ws/2'
+
+# Flags of the conf event: a sequence number at the end of every message,
+# and a checksum of the top of the books after their updates.
+SEQ_ALL = 65536
+OB_CHECKSUM = 131072
+
+CHECKSUM_DEPTH = 25
+
+
+def _pair(symbol):
+    """
+    Pair of a symbol of either API: 'tBTCUSD', 'BTCUSD' or 'btcusd'.
+    """
+    if symbol[:1] == 't' and symbol[1:].isupper():
+        symbol = symbol[1:]
+    return symbol.upper()
+
+
+def _js_number(value):
+    """
+    Text of a number as JavaScript writes it, which the checksums are
+    computed from.
+    """
+    if value == int(value) and abs(value) < 1e21:
+        return str(int(value))
+    text = repr(value)
+    if 'e' in text:
+        if abs(value) >= 1e-6:
+            return format(Decimal(text), 'f')
+        mantissa, exponent = text.split('e')
+        return '%se%s' % (mantissa, int(exponent))
+    return text
+
+
+def book_checksum(bids, asks):
+    """
+    CRC32 as a signed integer of the top levels of a book, ``bids`` and
+    ``asks`` being lists of (price, amount) sorted best first, with
+    positive amounts.
+    """
+    parts = []
+    for index in range(CHECKSUM_DEPTH):
+        if index < len(bids):
+            parts.append(_js_number(bids[index][0]))
+            parts.append(_js_number(bids[index][1]))
+        if index < len(asks):
+            parts.append(_js_number(asks[index][0]))
+            parts.append(_js_number(-asks[index][1]))
+    checksum = zlib.crc32(':'.join(parts).encode('ascii')) & 0xffffffff
+    return checksum - (1 << 32) if checksum >= 1 << 31 else checksum
+
+
+def rest_trade(trade):
+    """
+    Trade of the websocket API, [id, milliseconds, amount, price], as a
+    dictionary like the ones of :meth:`Public.trades`.
+    """
+    tid, mts, amount, price = trade[:4]
+    return {'tid': tid, 'timestamp': mts / 1000.0, 'price': float(price),
+            'amount': abs(float(amount)), 'exchange': 'bitfinex',
+            'type': 'buy' if amount > 0 else 'sell'}
+
+
+class LocalBook(object):
+    """
+    Order book of a symbol kept up to date from the book channel, as
+    dictionaries of the amounts by price of each side.
+
+    ``synced`` is False until the first snapshot and while the book is
+    resynchronized, ``source`` tells whether its levels come from the
+    websocket or from a REST snapshot.
+    """
+
+    def __init__(self, symbol, depth=25):
+        self.symbol = symbol
+        self.depth = depth
+        self.bids = {}
+        self.asks = {}
+        self.synced = False
+        self.source = None
+        self.timestamp = None
+
+    def __len__(self):
+        return len(self.bids) + len(self.asks)
+
+    def load_snapshot(self, levels):
+        """
+        Replace the levels with a snapshot of [price, count, amount].
+        """
+        self.bids.clear()
+        self.asks.clear()
+        for level in levels:
+            self.apply(*level[:3])
+        self.synced = True
+        self.source = 'websocket'
+
+    def load_rest(self, response):
+        """
+        Replace the levels with the response of :meth:`Public.orderbook`,
+        until the next snapshot.
+        """
+        self.bids = dict((float(level['price']), float(level['amount']))
+                         for level in response.get('bids') or ())
+        self.asks = dict((float(level['price']), float(level['amount']))
+                         for level in response.get('asks') or ())
+        self.timestamp = time.time()
+        self.source = 'rest'
+
+    def apply(self, price, count, amount):
+        """
+        Apply an update of the book channel: a count of 0 removes the level,
+        from the bids if the amount is 1, else from the asks.
+        """
+        if count == 0:
+            (self.bids if amount > 0 else self.asks).pop(price, None)
+        elif amount > 0:
+            self.bids[price] = amount
+        else:
+            self.asks[price] = -amount
+        self.timestamp = time.time()
+
+    def top(self, levels=None):
+        """
+        (bids, asks) lists of (price, amount), best first, of at most
+        ``levels`` levels.
+        """
+        levels = levels or max(len(self.bids), len(self.asks))
+        bids = heapq.nlargest(levels, self.bids.items())
+        asks = heapq.nsmallest(levels, self.asks.items())
+        return bids, asks
+
+    def checksum(self):
+        return book_checksum(*self.top(CHECKSUM_DEPTH))
+
+    def best_bid(self):
+        """
+        (price, amount) of the best bid, or None.
+        """
+        if self.bids:
+            price = max(self.bids)
+            return price, self.bids[price]
+
+    def best_ask(self):
+        """
+        (price, amount) of the best ask, or None.
+        """
+        if self.asks:
+            price = min(self.asks)
+            return price, self.asks[price]
+
+    def orderbook(self):
+        """
+        Copy of the book as a :class:`bitfinex_book.OrderBook`.
+        """
+        bids, asks = self.top()
+        return OrderBook._from_levels(bids, asks, self.timestamp)
+
+
+class TradeBuffer(object):
+    """
+    The latest ``maxlen`` trades of a symbol, oldest first, each added once.
+    """
+
+    def __init__(self, symbol, maxlen=1000):
+        self.symbol = symbol
+        self.trades = collections.deque(maxlen=maxlen)
+        self._tids = set()
+
+    def __len__(self):
+        return len(self.trades)
+
+    def __iter__(self):
+        return iter(self.trades)
+
+    @property
+    def last_timestamp(self):
+        return self.trades[-1]['timestamp'] if self.trades else None
+
+    def add(self, trade):
+        """
+        Add a trade unless it is already in the buffer. Returns True if it
+        was added.
+        """
+        if trade['tid'] in self._tids:
+            return False
+        if len(self.trades) == self.trades.maxlen:
+            self._tids.discard(self.trades[0]['tid'])
+        self.trades.append(trade)
+        self._tids.add(trade['tid'])
+        return True
+
+
+class _Updates(object):
+    """
+    Async iterator of the (symbol, data) updates of a kind. Keeps at most
+    ``maxsize`` updates waiting, dropping the oldest ones.
+    """
+
+    def __init__(self, stream, kind, symbol, maxsize):
+        self.stream = stream
+        self.kind = kind
+        self.symbol = symbol
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, symbol, data):
+        if self.symbol is not None and symbol != self.symbol:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((symbol, data))
+
+    def close(self):
+        self.stream._iterators[self.kind].remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class Stream(object):
+    """
+    Connection to the public channels of the websocket API.
+
+    Input:
+        url	[string]	Address of the websocket API.
+        session	[aiohttp.ClientSession]	Optional. Session to connect with. One is built if omitted.
+        rest_client	[Public or AsyncPublic]	Optional. Client to load books and missed trades from after a gap.
+        trade_buffer	[int]	Number of trades kept by symbol.
+        timeout	[float]	Seconds without any message, heartbeats included, after which the connection is opened again.
+        reconnect_delay	[float]	Seconds to wait before connecting again.
+        recorder	[file]	Optional. Text file to which the channel messages are written as json lines, for the stand-in server to replay.
+    """
+
+    def __init__(self, url=WS_URL, session=None, rest_client=None,
+                 trade_buffer=1000, timeout=30.0, reconnect_delay=1.0,
+                 recorder=None):
+        self.url = url
+        self.session = session
+        self._own_session = session is None
+        self.rest_client = rest_client
+        self.trade_buffer = trade_buffer
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.recorder = recorder
+        self.tickers = {}
+        self.books = {}
+        self.trades = {}
+        # (channel, pair) -> subscribe event, and chanId -> (channel, pair).
+        self._subscriptions = collections.OrderedDict()
+        self._channels = {}
+        self._callbacks = {'ticker': [], 'book': [], 'trades': []}
+        self._iterators = {'ticker': [], 'book': [], 'trades': []}
+        self._ws = None
+        self._task = None
+        self._closed = False
+        self._sequence = None
+        self.connected = asyncio.Event()
+        self.stats = collections.Counter()
+
+    def subscribe_ticker(self, symbol):
+        self._subscribe('ticker', symbol, {})
+
+    def subscribe_book(self, symbol, precision='P0', frequency='F0', length=25):
+        """
+        Subscribe to the book of a symbol. Returns its :class:`LocalBook`.
+        """
+        pair = _pair(symbol)
+        if pair not in self.books:
+            self.books[pair] = LocalBook(pair, length)
+        self._subscribe('book', symbol, {'prec': precision, 'freq': frequency,
+                                         'len': str(length)})
+        return self.books[pair]
+
+    def subscribe_trades(self, symbol):
+        """
+        Subscribe to the trades of a symbol. Returns its :class:`TradeBuffer`.
+        """
+        pair = _pair(symbol)
+        if pair not in self.trades:
+            self.trades[pair] = TradeBuffer(pair, self.trade_buffer)
+        self._subscribe('trades', symbol, {})
+        return self.trades[pair]
+
+    def _subscribe(self, channel, symbol, options):
+        pair = _pair(symbol)
+        event = dict(options, event='subscribe', channel=channel,
+                     symbol='t' + pair)
+        self._subscriptions[(channel, pair)] = event
+        if self._ws is not None:
+            asyncio.ensure_future(self._send(event))
+
+    def on(self, kind, callback):
+        """
+        Call ``callback(symbol, data)`` on each update of a kind: 'ticker'
+        with the ticker dictionary, 'book' with the :class:`LocalBook`,
+        'trades' with each new trade. A callback may be a coroutine
+        function.
+        """
+        self._callbacks[kind].append(callback)
+
+    def updates(self, kind, symbol=None, maxsize=1000):
+        """
+        Async iterator of the (symbol, data) updates of a kind, as passed to
+        the callbacks of :meth:`on`, optionally of one symbol only.
+        """
+        iterator = _Updates(self, kind, symbol and _pair(symbol), maxsize)
+        self._iterators[kind].append(iterator)
+        return iterator
+
+    def _emit(self, kind, symbol, data):
+        # A failing callback must not stop the stream.
+        for callback in self._callbacks[kind]:
+            try:
+                result = callback(symbol, data)
+            except Exception:
+                self.stats['callback_errors'] += 1
+                logger.exception('Stream %s callback failed', kind)
+                continue
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(self._guard(kind, result))
+        for iterator in self._iterators[kind]:
+            iterator.put(symbol, data)
+
+    async def _guard(self, kind, coroutine):
+        try:
+            await coroutine
+        except Exception:
+            self.stats['callback_errors'] += 1
+            logger.exception('Stream %s callback failed', kind)
+
+    async def start(self):
+        """
+        Open ``rest_client``, if it needs to, then connect in a background
+        task and wait for the connection.
+        """
+        if self._task is None:
+            if hasattr(self.rest_client, 'open'):
+                await self.rest_client.open()
+            self._task = asyncio.ensure_future(self.run())
+        await self.connected.wait()
+        return self
+
+    async def close(self):
+        self._closed = True
+        if self._ws is not None:
+            await self._ws.close()
+        elif self._task is not None:
+            self._task.cancel()
+        if self._task is not None:
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _send(self, event):
+        await self._ws.send_str(json.dumps(event))
+
+    async def run(self):
+        """
+        Receive and apply the messages until closed, connecting again when
+        the connection is lost.
+        """
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        while not self._closed:
+            try:
+                await self._connection()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError):
+                pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats['connection_errors'] += 1
+                logger.exception('Stream connection failed, connecting again')
+            self.connected.clear()
+            self._ws = None
+            if not self._closed:
+                self.stats['reconnects'] += 1
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def _connection(self):
+        async with self.session.ws_connect(self.url, heartbeat=None) as ws:
+            self._ws = ws
+            self._channels.clear()
+            self._sequence = None
+            for book in self.books.values():
+                book.synced = False
+            await self._send({'event': 'conf', 'flags': SEQ_ALL | OB_CHECKSUM})
+            for event in list(self._subscriptions.values()):
+                await self._send(event)
+            self.connected.set()
+            while not self._closed:
+                message = await ws.receive(timeout=self.timeout)
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    return
+                try:
+                    self.handle(json.loads(message.data))
+                except Exception:
+                    # The books may be half updated: load them again.
+                    self.stats['bad_messages'] += 1
+                    logger.exception('Stream message could not be applied: %.200s',
+                                     message.data)
+                    self._resync_all()
+
+    def handle(self, message):
+        """
+        Apply a message of the websocket API.
+        """
+        self.stats['messages'] += 1
+        if isinstance(message, dict):
+            return self._handle_event(message)
+        # The sequence number is the last item.
+        sequence = message[-1]
+        if self._sequence is not None and sequence != self._sequence + 1:
+            self.stats['gaps'] += 1
+            self._resync_all()
+        self._sequence = sequence
+        subscription = self._channels.get(message[0])
+        if subscription is None:
+            return
+        channel, pair = subscription
+        payload = message[1:-1]
+        if payload[0] == 'hb':
+            return
+        if self.recorder is not None:
+            self.recorder.write(json.dumps({'channel': channel, 'pair': pair,
+                                            'message': payload}) + '\n')
+        getattr(self, '_on_' + channel)(pair, payload)
+
+    def _handle_event(self, event):
+        kind = event.get('event')
+        if kind == 'subscribed':
+            self._channels[event['chanId']] = (event['channel'], _pair(event['symbol']))
+        elif kind == 'error':
+            self.stats['errors'] += 1
+
+    def _on_ticker(self, pair, payload):
+        values = payload[0]
+        bid, ask = float(values[0]), float(values[2])
+        ticker = {'bid': bid, 'ask': ask, 'mid': (bid + ask) / 2,
+                  'last_price': float(values[6]), 'volume': float(values[7]),
+                  'high': float(values[8]), 'low': float(values[9]),
+                  'timestamp': time.time()}
+        self.tickers[pair] = ticker
+        self._emit('ticker', pair, ticker)
+
+    def _on_book(self, pair, payload):
+        book = self.books[pair]
+        if payload[0] == 'cs':
+            if book.synced and book.checksum() != payload[1]:
+                self.stats['checksum_errors'] += 1
+                self._resync(pair)
+            return
+        levels = payload[0]
+        if levels and isinstance(levels[0], list):
+            book.load_snapshot(levels)
+        elif levels:
+            book.apply(*levels[:3])
+        self._emit('book', pair, book)
+
+    def _on_trades(self, pair, payload):
+        buffer = self.trades[pair]
+        if payload[0] == 'te':
+            trades = [payload[1]]
+        elif payload[0] == 'tu':
+            return
+        else:
+            # Snapshot, newest first.
+            trades = reversed(payload[0])
+        for trade in trades:
+            trade = rest_trade(trade)
+            if buffer.add(trade):
+                self._emit('trades', pair, trade)
+
+    def _resync_all(self):
+        for pair in self.books:
+            self._resync(pair)
+        if self.rest_client is not None:
+            for pair in self.trades:
+                asyncio.ensure_future(self._backfill_trades(pair))
+
+    def _resync(self, pair):
+        """
+        Load the book from REST meanwhile, if possible, and subscribe to it
+        again for a fresh snapshot.
+        """
+        self.stats['resyncs'] += 1
+        book = self.books[pair]
+        book.synced = False
+        if self.rest_client is not None:
+            asyncio.ensure_future(self._load_rest_book(pair))
+        for chan_id, subscription in list(self._channels.items()):
+            if subscription == ('book', pair):
+                del self._channels[chan_id]
+                if self._ws is not None:
+                    asyncio.ensure_future(self._resubscribe(
+                        chan_id, self._subscriptions[('book', pair)]))
+
+    async def _resubscribe(self, chan_id, event):
+        await self._send({'event': 'unsubscribe', 'chanId': chan_id})
+        await self._send(event)
+
+    async def _rest(self, name, *args):
+        method = getattr(self.rest_client, name)
+        if hasattr(self.rest_client, '__aenter__'):
+            return await method(*args)
+        # A blocking client: make the call in a thread.
+        return await asyncio.get_event_loop().run_in_executor(
+            None, functools.partial(method, *args))
+
+    async def _rest_call(self, name, *args):
+        try:
+            return await self._rest(name, *args)
+        except Exception:
+            self.stats['rest_errors'] += 1
+            logger.warning('REST %s%r failed during a resync', name, args,
+                           exc_info=True)
+            return None
+
+    async def _load_rest_book(self, pair):
+        response = await self._rest_call('orderbook', pair)
+        book = self.books[pair]
+        # Unless the websocket snapshot came first.
+        if response is not None and not book.synced:
+            book.load_rest(response)
+            self.stats['rest_books'] += 1
+            self._emit('book', pair, book)
+
+    async def _backfill_trades(self, pair):
+        buffer = self.trades[pair]
+        since = buffer.last_timestamp
+        response = await self._rest_call('trades', pair, since)
+        for trade in reversed(response or ()):
+            trade = dict(trade, tid=int(trade['tid']),
+                         timestamp=float(trade['timestamp']),
+                         price=float(trade['price']), amount=float(trade['amount']))
+            if buffer.add(trade):
+                self.stats['rest_trades'] += 1
+                self._emit('trades', pair, trade)